@@ -6,7 +6,11 @@
     "author": "Camptocamp,Akretion,Odoo Community Association (OCA)",
     "maintainer": "Camptocamp",
     "category": "Delivery",
-    "depends": ["delivery_carrier_info"],
+    "depends": [
+        "delivery_carrier_info",
+        "delivery_carrier_label_merge",
+        "delivery_carrier_rate_limit",
+    ],
     "website": "https://github.com/OCA/delivery-carrier",
     "data": [
         "views/delivery.xml",
@@ -2,7 +2,7 @@
 # Copyright 2014 Camptocamp SA
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
 
-from odoo import api, fields, models
+from odoo import api, fields, models, tools
 
 
 class CarrierAccount(models.Model):
@@ -43,3 +43,43 @@ class CarrierAccount(models.Model):
         string="File Format",
         help="Default format of the carrier's label you want to print",
     )
+    rate_limit = fields.Float(
+        string="Requests per Second",
+        help="Maximum number of requests per second sent to the carrier with "
+        "this account by all the workers of the server. 0 means the limit "
+        "of the delivery method is used.",
+    )
+    rate_limit_burst = fields.Integer(
+        string="Request Burst",
+        default=1,
+        help="Number of requests which can be sent at once when no request "
+        "was sent for a while, without exceeding the requests per second "
+        "on average.",
+    )
+
+    @api.model
+    @tools.ormcache(
+        "self.env.uid",
+        "self.env.su",
+        "self.env.user.company_id.id",
+        "tuple(self.env.companies.ids)",
+        "self.env.context.get('active_test', True)",
+    )
+    def _get_account_index(self):
+        """Return the ids of the accounts visible to the user, by order of
+        precedence
+        """
+        return tuple(self.search([], order="company_id asc, sequence asc").ids)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.clear_caches()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        self.clear_caches()
+        return super().write(vals)
+
+    def unlink(self):
+        self.clear_caches()
+        return super().unlink()
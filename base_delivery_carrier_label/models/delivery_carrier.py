@@ -15,6 +15,12 @@ class DeliveryCarrier(models.Model):
         context={"active_test": False},
     )
 
+    def _get_rate_limited_record(self, account=None):
+        """The rate limit of the carrier account takes precedence"""
+        if account and account.rate_limit > 0:
+            return account
+        return super()._get_rate_limited_record(account=account)
+
     def alternative_send_shipping(self, pickings):
         return {}
 
@@ -40,7 +46,11 @@ class DeliveryCarrier(models.Model):
         # carrier implemented in roulier lib.
         if result is None:
             result = self.alternative_send_shipping(pickings)
-        for result_dict, picking in zip(result, pickings):
-            for label in result_dict.get("labels", []):
-                picking.attach_shipping_label(label)
+        picking_labels = [
+            (picking, label)
+            for result_dict, picking in zip(result, pickings)
+            for label in result_dict.get("labels", [])
+        ]
+        if picking_labels:
+            pickings._attach_shipping_labels(picking_labels)
         return result
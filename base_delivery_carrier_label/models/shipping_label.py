@@ -19,4 +19,5 @@ class ShippingLabel(models.Model):
         string="Attachement",
         required=True,
         ondelete="cascade",
+        index=True,
     )
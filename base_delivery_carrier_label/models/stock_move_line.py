@@ -2,12 +2,10 @@
 # Copyright 2016 Camptocamp SA
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
-import logging
+from collections import defaultdict
 
 from odoo import fields, models
 
-_logger = logging.getLogger(__name__)
-
 
 class StockMoveLine(models.Model):
     _inherit = "stock.move.line"
@@ -17,32 +15,48 @@ class StockMoveLine(models.Model):
     def get_weight(self):
         """Calc and save weight of pack.operations.
 
-        Warning: Type conversion not implemented
-                it will return False if at least one uom or uos not in kg
+        The quantity of each line is converted in the unit of measure of
+        its product, whose weight is given for one unit. The weight is
+        expressed in the weight unit of measure of the settings, like the
+        weight of the products.
         return:
             the sum of the weight of [self]
         """
+        if not self:
+            return 0
+        lines = self.read(
+            ["product_id", "qty_done", "product_qty", "product_uom_id"], load=False
+        )
+        products = self.env["product.product"].browse(
+            {line["product_id"] for line in lines if line["product_id"]}
+        )
+        products = {product.id: product for product in products}
+        uoms = self.env["uom.uom"].browse(
+            {line["product_uom_id"] for line in lines if line["product_uom_id"]}
+        )
+        uoms = {uom.id: uom for uom in uoms}
+        ids_by_weight = defaultdict(list)
         total_weight = 0
-        kg = self.env.ref("uom.product_uom_kgm").id
-        units = self.env.ref("uom.product_uom_unit").id
-        allowed = (False, kg, units)
-        cant_calc_total = False
-        for operation in self:
-            product = operation.product_id
-
-            # if not defined we assume it's in kg
-            if product.uom_id.id not in allowed:
-                _logger.warning(
-                    "Type conversion not implemented for product %s" % product.id
-                )
-                cant_calc_total = True
-            # product_qty may be 0 if you don't set move line
-            # individually but directly validate the picking
-            qty = operation.qty_done or operation.product_qty
-            operation.weight = product.weight * qty
-
-            total_weight += operation.weight
-
-        if cant_calc_total:
-            return False
+        for line in lines:
+            weight = 0
+            product_id = line["product_id"]
+            if product_id:
+                product = products[product_id]
+                # product_qty may be 0 if you don't set move line
+                # individually but directly validate the picking
+                if line["qty_done"]:
+                    qty = line["qty_done"]
+                    line_uom = uoms.get(line["product_uom_id"])
+                    if line_uom and line_uom != product.uom_id:
+                        qty = line_uom._compute_quantity(
+                            qty, product.uom_id, round=False
+                        )
+                else:
+                    # product_qty is already in the unit of the product
+                    qty = line["product_qty"]
+                weight = product.weight * qty
+            ids_by_weight[weight].append(line["id"])
+            total_weight += weight
+        for weight, ids in ids_by_weight.items():
+            self.browse(ids).write({"weight": weight})
         return total_weight
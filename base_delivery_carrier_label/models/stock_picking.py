@@ -3,6 +3,7 @@
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
 import logging
+from collections import defaultdict
 
 from odoo import _, api, fields, models
 from odoo.exceptions import UserError
@@ -24,31 +25,63 @@ class StockPicking(models.Model):
     )
 
     def get_shipping_label_values(self, label):
+        """Return the values of the shipping.label of a label
+
+        The label file is given either base64 encoded in `file` or as bytes
+        in `raw`.
+        """
         self.ensure_one()
-        return {
+        values = {
             "name": label["name"],
             "res_id": self.id,
             "res_model": "stock.picking",
-            "datas": label["file"],
             "file_type": label["file_type"],
         }
+        if label.get("raw") is not None:
+            values["raw"] = label["raw"]
+        else:
+            values["datas"] = label["file"]
+        return values
 
     def attach_shipping_label(self, label):
         """Attach a label returned by generate_shipping_labels to a picking"""
         self.ensure_one()
-        data = self.get_shipping_label_values(label)
-        if label.get("package_id"):
-            data["package_id"] = label["package_id"]
-            if label.get("tracking_number"):
-                self.env["stock.quant.package"].browse(label["package_id"]).write(
-                    {"parcel_tracking": label.get("tracking_number")}
-                )
+        return self._attach_shipping_labels([(self, label)])
+
+    def _attach_shipping_labels(self, picking_labels):
+        """Attach labels to their pickings at once
+
+        The tracking numbers of the packages are written grouped by value.
+
+        :param picking_labels: list of tuples (picking, label)
+        :return: the created shipping.label records
+        """
+        data_list = []
+        package_ids_by_tracking = defaultdict(list)
+        for picking, label in picking_labels:
+            data = picking.get_shipping_label_values(label)
+            if label.get("package_id"):
+                data["package_id"] = label["package_id"]
+                if label.get("tracking_number"):
+                    package_ids_by_tracking[label["tracking_number"]].append(
+                        label["package_id"]
+                    )
+            data_list.append(data)
+        package_model = self.env["stock.quant.package"]
+        for tracking_number, package_ids in package_ids_by_tracking.items():
+            package_model.browse(package_ids).write(
+                {"parcel_tracking": tracking_number}
+            )
         context_attachment = self.env.context.copy()
         # remove default_type setted for stock_picking
         # as it would try to define default value of attachement
         if "default_type" in context_attachment:
             del context_attachment["default_type"]
-        return self.env["shipping.label"].with_context(context_attachment).create(data)
+        return (
+            self.env["shipping.label"]
+            .with_context(context_attachment)
+            .create(data_list)
+        )
 
     def _set_a_default_package(self):
         """Pickings using this module must have a package
@@ -159,13 +192,15 @@ class StockPicking(models.Model):
         ]
 
     def _get_carrier_account(self):
-        """ Return a carrier suitable for the current picking """
-        domain = self._get_carrier_account_domain()
-        return self.env["carrier.account"].search(
-            domain,
-            limit=1,
-            order="company_id asc, sequence asc",
-        )
+        """Return a carrier suitable for the current picking
+
+        The accounts matching `_get_carrier_account_domain` are filtered from
+        an index of the accounts by order of precedence, cached until they
+        change.
+        """
+        account_model = self.env["carrier.account"]
+        accounts = account_model.browse(account_model._get_account_index())
+        return accounts.filtered_domain(self._get_carrier_account_domain())[:1]
 
     def _get_label_sender_address(self):
         """On each carrier label module you need to define
@@ -193,15 +228,29 @@ class StockPicking(models.Model):
     def _check_existing_shipping_label(self):
         """ Check that labels don't already exist for this picking """
         self.ensure_one()
-        labels = self.env["shipping.label"].search(
-            [("res_id", "=", self.id), ("res_model", "=", "stock.picking")]
+        self._check_existing_shipping_labels()
+
+    def _check_existing_shipping_labels(self):
+        """ Check that labels don't already exist for these pickings """
+        if not self:
+            return
+        groups = self.env["shipping.label"].read_group(
+            [("res_model", "=", "stock.picking"), ("res_id", "in", self.ids)],
+            ["res_id"],
+            ["res_id"],
         )
-        if labels:
+        picking_ids = {group["res_id"] for group in groups}
+        if picking_ids:
+            pickings = self.filtered(lambda picking: picking.id in picking_ids)
             raise UserError(
                 _(
                     "Some labels already exist for the picking %s.\n"
                     "Please delete the existing labels in the "
                     "attachments of this picking and try again"
                 )
-                % self.name
+                % ", ".join(pickings.mapped("name"))
             )
+
+    def action_download_merged_shipping_labels(self):
+        """Download the labels of the pickings as one document"""
+        return self._action_download_merged_labels("shipping.label", "shipping_labels")
@@ -2,6 +2,8 @@
 # Copyright 2014-2016 Camptocamp SA
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
+from collections import defaultdict
+
 from odoo import api, fields, models
 
 
@@ -19,24 +21,40 @@ class StockQuantPackage(models.Model):
         otherwise fallback on the computed weight
         """
         to_do = self.browse()
+        from_operations = self.browse()
         for pack in self:
             if pack.shipping_weight:
                 pack.weight = pack.shipping_weight
             elif not pack.quant_ids and not self.env.context.get("picking_id"):
-                # package.pack_operations would be too easy
-                operations = self.env["stock.move.line"].search(
-                    [
-                        ("result_package_id", "=", pack.id),
-                        ("package_id", "=", False),
-                        ("product_id", "!=", False),
-                    ]
-                )
-                pack.weight = operations.get_weight()
+                from_operations |= pack
             else:
                 to_do |= pack
+        if from_operations:
+            weights = from_operations._get_weight_from_operations()
+            for pack in from_operations:
+                pack.weight = weights.get(pack.id, 0)
         if to_do:
             super(StockQuantPackage, to_do)._compute_weight()
 
+    def _get_weight_from_operations(self):
+        """Return the weight of the packages from their move lines
+
+        The move lines of all the packages are searched and weighed at once.
+        """
+        # package.pack_operations would be too easy
+        operations = self.env["stock.move.line"].search(
+            [
+                ("result_package_id", "in", self.ids),
+                ("package_id", "=", False),
+                ("product_id", "!=", False),
+            ]
+        )
+        operations.get_weight()
+        weights = defaultdict(float)
+        for operation in operations:
+            weights[operation.result_package_id.id] += operation.weight
+        return weights
+
     def _complete_name(self, name, args):
         res = super()._complete_name(name, args)
         for pack in self:
@@ -199,9 +199,8 @@ class TestGetWeight(TransactionCase):
                 }
             )
         )
-        products_weight = (
-            weights[0] * 1000 + weights[1] * 1 + weights[2] * 0.01  # tonne  # kg  # g
-        )
+        # the weight of the products is given for one unit of their uom
+        products_weight = sum(weights)
         picking = self._generate_picking(products)
         operations = self.env["stock.move.line"]
         for product in products:
@@ -216,9 +215,47 @@ class TestGetWeight(TransactionCase):
             )
         # end of prepare data
 
-        # because uom conversion is not implemented
-        self.assertEqual(package.weight, False)
+        self.assertAlmostEqual(package.weight, products_weight)
+        self.assertAlmostEqual(operations.get_weight(), products_weight)
+
+    def test_get_weight_line_uom(self):
+        """The done quantity is converted in the uom of the product."""
+        unit = self.env.ref("uom.product_uom_unit")
+        product = self._create_product(
+            {"name": "Cup", "uom_id": unit.id, "uom_po_id": unit.id, "weight": 2}
+        )
+        picking = self._generate_picking([product])
+        dozen = self.env.ref("uom.product_uom_dozen")
+        operation = self._create_operation(
+            picking,
+            {
+                "product_id": product.id,
+                "product_uom_id": dozen.id,
+                "qty_done": 1,
+            },
+        )
+        self.assertAlmostEqual(operation.get_weight(), 24)
+        self.assertAlmostEqual(operation.weight, 24)
 
-        # if one day, uom conversion is implemented:
-        # self.assertEqual(package.get_weight(), products_weight)
-        self.assertEqual(products_weight, products_weight)  # flak8 warning
+    def test_get_weight_many_packages(self):
+        """Weight of many packages computed together."""
+        weights = [2, 30, 1]
+        products = self._get_products(weights)
+        picking = self._generate_picking(products)
+        packages = self.env["stock.quant.package"].create([{}, {}, {}])
+        for product, package in zip(products, packages):
+            self._create_operation(
+                picking,
+                {
+                    "product_uom_qty": 2,
+                    "product_id": product.id,
+                    "product_uom_id": product.uom_id.id,
+                    "result_package_id": package.id,
+                },
+            )
+        packages[2].shipping_weight = 42.0
+        packages.invalidate_cache(["weight"])
+        self.assertEqual(
+            packages.mapped("weight"),
+            [products[0].weight * 2, products[1].weight * 2, 42.0],
+        )
@@ -2,8 +2,13 @@
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 import base64
 
+import mock
+
+from odoo.exceptions import UserError
 from odoo.tests.common import TransactionCase
 
+from odoo.addons.delivery_carrier_label_merge import label_merge
+
 
 class TestHelperFunctions(TransactionCase):
     """Test convenience functions on stock.picking"""
@@ -50,6 +55,24 @@ class TestHelperFunctions(TransactionCase):
         account = pick._get_carrier_account()
         self.assertEqual(account, second_account_with_company)
 
+        # the cached accounts are refreshed when an account is removed
+        second_account_with_company.unlink()
+        account = pick._get_carrier_account()
+        self.assertEqual(account, account_with_company)
+
+        # overrides of the domain of the accounts are honoured
+        picking_class = type(pick)
+        domain = picking_class._get_carrier_account_domain
+        with mock.patch.object(
+            picking_class,
+            "_get_carrier_account_domain",
+            autospec=True,
+            side_effect=lambda picking: domain(picking)
+            + [("id", "!=", account_with_company.id)],
+        ):
+            account = pick._get_carrier_account()
+        self.assertEqual(account, account_without_company)
+
     def test_attach_shipping_label(self):
         """Test if attaching labels works correctly"""
         picking = self.env["stock.picking"].new(
@@ -73,3 +96,121 @@ class TestHelperFunctions(TransactionCase):
             )
         )
         self.assertEqual(label.name, "hello_world.pdf")
+        self.assertEqual(label.raw, b"hello world")
+        self.assertEqual(label.file_size, 11)
+
+    def test_attach_shipping_labels(self):
+        """Test attaching the labels of many pickings at once"""
+        pickings = self.env["stock.picking"].search([], limit=2)
+        packages = self.env["stock.quant.package"].create(
+            [{"name": "package 1"}, {"name": "package 2"}, {"name": "package 3"}]
+        )
+        picking_labels = [
+            (
+                picking,
+                dict(
+                    name="label_%s.pdf" % package.name,
+                    file=base64.b64encode(b"label"),
+                    file_type="pdf",
+                    package_id=package.id,
+                    tracking_number=tracking_number,
+                ),
+            )
+            for picking, package, tracking_number in zip(
+                pickings + pickings[:1], packages, ("T1", "T1", "T2")
+            )
+        ]
+        labels = pickings.with_context(
+            default_type="some_type"
+        )._attach_shipping_labels(picking_labels)
+        self.assertEqual(len(labels), 3)
+        self.assertEqual(labels.mapped("package_id"), packages)
+        self.assertEqual(labels.mapped("res_id"), (pickings + pickings[:1]).ids)
+        self.assertEqual(packages.mapped("parcel_tracking"), ["T1", "T1", "T2"])
+
+    def test_check_existing_shipping_labels(self):
+        """Test the existing labels of many pickings are checked at once"""
+        pickings = self.env["stock.picking"].search([], limit=3)
+        pickings._check_existing_shipping_labels()
+        pickings[1]._attach_shipping_labels(
+            [
+                (
+                    pickings[1],
+                    dict(
+                        name="label.pdf",
+                        file=base64.b64encode(b"label"),
+                        file_type="pdf",
+                    ),
+                )
+            ]
+        )
+        pickings[0]._check_existing_shipping_label()
+        with self.assertRaisesRegex(UserError, pickings[1].name):
+            pickings._check_existing_shipping_labels()
+
+    def test_rate_limit_bucket(self):
+        """Test the rate limit of the account takes precedence"""
+        carrier = self.env.ref("delivery.normal_delivery_carrier")
+        account = self.env["carrier.account"].create(
+            {
+                "name": "Rate limited account",
+                "account": "account",
+                "password": "password",
+            }
+        )
+        self.assertIsNone(carrier._get_rate_limit_bucket(account))
+        carrier.write({"rate_limit": 5, "rate_limit_burst": 2})
+        bucket = carrier._get_rate_limit_bucket(account)
+        self.assertEqual((bucket.rate, bucket.capacity), (5, 2))
+        account.write({"rate_limit": 0.5})
+        bucket = carrier._get_rate_limit_bucket(account)
+        self.assertEqual((bucket.rate, bucket.capacity), (0.5, 1))
+        self.assertNotEqual(bucket.path, carrier._get_rate_limit_bucket().path)
+
+    def _create_picking_with_labels(self, *labels):
+        picking = self.env["stock.picking"].create(
+            {
+                "picking_type_id": self.env.ref("stock.picking_type_out").id,
+                "location_id": self.env.ref("stock.stock_location_stock").id,
+                "location_dest_id": self.env.ref("stock.stock_location_customers").id,
+            }
+        )
+        for raw, file_type in labels:
+            self.env["shipping.label"].create(
+                dict(
+                    raw=raw,
+                    name="label.%s" % file_type,
+                    res_model="stock.picking",
+                    res_id=picking.id,
+                    file_type=file_type,
+                )
+            )
+        return picking
+
+    def test_merged_labels(self):
+        """Test the labels of many pickings are collected in order"""
+        pickings = self._create_picking_with_labels(
+            (b"^XA^FDfirst^FS^XZ", "zpl")
+        ) | self._create_picking_with_labels(
+            (b"^XA^FDsecond^FS^XZ", "zpl"), (b"^XA^FDthird^FS^XZ", "zpl")
+        )
+        labels = self.env["shipping.label"].search(
+            [("res_model", "=", "stock.picking"), ("res_id", "in", pickings.ids)],
+            order="id",
+        )
+        self.assertEqual(len(labels), 3)
+        file_type, sources = pickings._get_merged_label_sources("shipping.label")
+        self.assertEqual(file_type, "zpl")
+        self.assertEqual(
+            sources, label_merge.get_sources(labels.mapped("attachment_id"))
+        )
+        action = pickings.action_download_merged_shipping_labels()
+        merge = self.env["delivery.carrier.label.merge"].browse(
+            int(action["url"].rsplit("/", 1)[1])
+        )
+        self.assertEqual(merge.label_model, "shipping.label")
+        self.assertEqual(merge._get_pickings().ids, pickings.ids)
+
+        pickings |= self._create_picking_with_labels((b"%PDF", "pdf"))
+        with self.assertRaises(UserError):
+            pickings.action_download_merged_shipping_labels()
@@ -10,18 +10,19 @@ from odoo.tests.common import Form, TransactionCase
 class TestSend(TransactionCase):
     """Test sending a picking"""
 
-    def test_send(self):
-        """Test if the module picks up labels returned from delivery.carrier#send"""
-        carrier = self.env.ref("delivery.normal_delivery_carrier")
+    def setUp(self):
+        super().setUp()
+        self.carrier = self.env.ref("delivery.normal_delivery_carrier")
         picking_form = Form(
             self.env["stock.picking"].with_context(
                 default_picking_type_id=self.env.ref("stock.picking_type_out").id,
             )
         )
-        picking_form.carrier_id = carrier
-        picking = picking_form.save()
+        picking_form.carrier_id = self.carrier
+        self.picking = picking_form.save()
 
-        with mock.patch.object(type(carrier), "fixed_send_shipping") as mocked:
+    def _send(self):
+        with mock.patch.object(type(self.carrier), "fixed_send_shipping") as mocked:
             mocked.return_value = [
                 dict(
                     labels=[
@@ -34,9 +35,11 @@ class TestSend(TransactionCase):
                 )
             ]
             labels_before = self.env["shipping.label"].search([])
-            carrier.send_shipping(picking)
-            label = self.env["shipping.label"].search([]) - labels_before
-            self.assertTrue(label, "No label created")
-            self.assertEqual(
-                label.mimetype, "application/pdf", "Wrong attachment created"
-            )
+            self.carrier.send_shipping(self.picking)
+            return self.env["shipping.label"].search([]) - labels_before
+
+    def test_send(self):
+        """Test if the module picks up labels returned from delivery.carrier#send"""
+        label = self._send()
+        self.assertTrue(label, "No label created")
+        self.assertEqual(label.mimetype, "application/pdf", "Wrong attachment created")
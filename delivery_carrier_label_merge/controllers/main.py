@@ -0,0 +1,33 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import http
+from odoo.http import content_disposition, request
+
+from .. import label_merge
+
+
+class LabelMergeController(http.Controller):
+    @http.route(
+        "/delivery_carrier_label_merge/<int:merge_id>", type="http", auth="user"
+    )
+    def merged_labels(self, merge_id, **kwargs):
+        """Stream the labels of the pickings merged in one document"""
+        merge = request.env["delivery.carrier.label.merge"].search(
+            [("id", "=", merge_id), ("create_uid", "=", request.env.uid)]
+        )
+        if not merge:
+            return request.not_found()
+        pickings = merge._get_pickings()
+        pickings.check_access_rights("read")
+        pickings.check_access_rule("read")
+        file_type, sources = pickings._get_merged_label_sources(merge.label_model)
+        filename = "%s.%s" % (merge.filename, file_type)
+        return http.Response(
+            label_merge.iter_merged(file_type, sources),
+            headers=[
+                ("Content-Type", label_merge.MIMETYPES[file_type]),
+                ("Content-Disposition", content_disposition(filename)),
+            ],
+            direct_passthrough=True,
+        )
@@ -0,0 +1,124 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+"""Merge the shipping labels of many pickings in one printable document
+
+ZPL labels are printer commands and are concatenated on the fly, one label
+file at a time.
+
+PDF labels are merged with PyPDF2, which keeps the documents it merges in
+memory until the merged one is written. They are merged by batches into
+temporary files, which are merged again by batches until one is left and
+streamed, so that the memory used does not grow with the number of labels.
+
+The labels are read from the filestore by path, so the merged document can
+be produced after the cursor of the request is closed.
+"""
+import io
+import tempfile
+
+from PyPDF2 import PdfFileReader, PdfFileWriter
+
+CHUNK_SIZE = 64 * 1024
+MERGE_BATCH_SIZE = 100
+
+MIMETYPES = {
+    "pdf": "application/pdf",
+    "zpl": "application/octet-stream",
+}
+
+
+def normalize_file_type(file_type):
+    """Return 'pdf' or 'zpl' for the label formats which can be merged"""
+    file_type = (file_type or "").lower()
+    if file_type.startswith("zpl"):
+        return "zpl"
+    return file_type
+
+
+def get_sources(attachments):
+    """Return where the content of attachments is read from
+
+    :return: list of file paths for the attachments of the filestore and
+             bytes for the ones stored in database
+    """
+    return [
+        attachment._full_path(attachment.store_fname)
+        if attachment.store_fname
+        else attachment.raw
+        for attachment in attachments
+    ]
+
+
+def _open(source):
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    if isinstance(source, str):
+        return open(source, "rb")
+    # temporary file of a previous batch
+    return source
+
+
+def iter_concatenated(sources, chunk_size=CHUNK_SIZE):
+    """Yield the content of the sources one after the other, by chunks"""
+    for source in sources:
+        with _open(source) as stream:
+            chunk = stream.read(chunk_size)
+            while chunk:
+                yield chunk
+                chunk = stream.read(chunk_size)
+
+
+def _merge_pdf_batch(sources):
+    """Merge PDF files in a temporary file, positioned at its start"""
+    streams = [_open(source) for source in sources]
+    try:
+        writer = PdfFileWriter()
+        for stream in streams:
+            reader = PdfFileReader(stream, strict=False)
+            for page_num in range(reader.getNumPages()):
+                writer.addPage(reader.getPage(page_num))
+        output = tempfile.TemporaryFile()
+        writer.write(output)
+    finally:
+        for stream in streams:
+            stream.close()
+    output.seek(0)
+    return output
+
+
+def merge_pdf(sources, batch_size=MERGE_BATCH_SIZE):
+    """Merge PDF files in a temporary file
+
+    At most `batch_size` documents are merged at once: the merged documents
+    of the batches are merged again by batches, until one is left.
+
+    :return: a temporary file, positioned at its start
+    """
+    batch_size = max(batch_size, 2)
+    sources = list(sources)
+    while True:
+        sources = [
+            _merge_pdf_batch(sources[start : start + batch_size])
+            for start in range(0, len(sources) or 1, batch_size)
+        ]
+        if len(sources) == 1:
+            return sources[0]
+
+
+def iter_file(fileobj, chunk_size=CHUNK_SIZE):
+    """Yield the content of a file by chunks and close it"""
+    with fileobj:
+        chunk = fileobj.read(chunk_size)
+        while chunk:
+            yield chunk
+            chunk = fileobj.read(chunk_size)
+
+
+def iter_merged(file_type, sources):
+    """Yield the merged document of the labels by chunks
+
+    :param file_type: 'pdf' or 'zpl'
+    """
+    if file_type == "zpl":
+        return iter_concatenated(sources)
+    return iter_file(merge_pdf(sources))
@@ -0,0 +1,2 @@
+from . import delivery_carrier_label_merge
+from . import stock_picking
@@ -0,0 +1,30 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import fields, models
+
+
+class DeliveryCarrierLabelMerge(models.TransientModel):
+    """Labels of pickings to download as one document
+
+    The ids of the pickings are kept here rather than in the URL of the
+    download, which would be too long for many pickings.
+    """
+
+    _name = "delivery.carrier.label.merge"
+    _description = "Shipping Labels to Merge"
+
+    label_model = fields.Char(required=True)
+    picking_list = fields.Text(
+        required=True,
+        help="Ids of the pickings separated by commas, in the order of the labels",
+    )
+    filename = fields.Char(
+        required=True, help="Name of the document, without extension"
+    )
+
+    def _get_pickings(self):
+        self.ensure_one()
+        return self.env["stock.picking"].browse(
+            [int(picking_id) for picking_id in self.picking_list.split(",")]
+        )
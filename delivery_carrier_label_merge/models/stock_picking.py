@@ -0,0 +1,77 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import _, models
+from odoo.exceptions import UserError
+
+from .. import label_merge
+
+
+class StockPicking(models.Model):
+    _inherit = "stock.picking"
+
+    def _get_merged_label_file_type(self, label_model):
+        """Return the format of the labels of the pickings to merge
+
+        Only the formats of the labels are read, not their files.
+
+        :param label_model: name of the model of the labels, inheriting from
+                            `ir.attachment` and having a `file_type` field
+        :return: 'pdf' or 'zpl'
+        """
+        groups = self.env[label_model].read_group(
+            [("res_model", "=", "stock.picking"), ("res_id", "in", self.ids)],
+            ["file_type"],
+            ["file_type"],
+        )
+        if not groups:
+            raise UserError(_("There is no shipping label to print."))
+        file_types = {
+            label_merge.normalize_file_type(group["file_type"]) for group in groups
+        }
+        if len(file_types) > 1:
+            raise UserError(
+                _("Labels of different formats (%s) cannot be printed together.")
+                % ", ".join(sorted(file_types))
+            )
+        file_type = file_types.pop()
+        if file_type not in label_merge.MIMETYPES:
+            raise UserError(_("Labels in %s cannot be merged.") % file_type)
+        return file_type
+
+    def _get_merged_label_sources(self, label_model):
+        """Return the labels of the pickings to merge in one document
+
+        :param label_model: name of the model of the labels
+        :return: tuple (file type, list of sources as expected by
+                 `label_merge.iter_merged`), in the order of the pickings
+        """
+        file_type = self._get_merged_label_file_type(label_model)
+        labels = self.env[label_model].search(
+            [("res_model", "=", "stock.picking"), ("res_id", "in", self.ids)],
+            order="id",
+        )
+        position = {picking_id: index for index, picking_id in enumerate(self.ids)}
+        labels = labels.sorted(key=lambda label: position[label.res_id])
+        return file_type, label_merge.get_sources(labels.mapped("attachment_id"))
+
+    def _action_download_merged_labels(self, label_model, filename):
+        """Return the action downloading the labels of the pickings as one
+        document
+
+        :param label_model: name of the model of the labels
+        :param filename: name of the document, without extension
+        """
+        self._get_merged_label_file_type(label_model)
+        merge = self.env["delivery.carrier.label.merge"].create(
+            {
+                "label_model": label_model,
+                "picking_list": ",".join(str(picking_id) for picking_id in self.ids),
+                "filename": filename,
+            }
+        )
+        return {
+            "type": "ir.actions.act_url",
+            "url": "/delivery_carrier_label_merge/%s" % merge.id,
+            "target": "self",
+        }
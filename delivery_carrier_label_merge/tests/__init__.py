@@ -0,0 +1 @@
+from . import test_label_merge
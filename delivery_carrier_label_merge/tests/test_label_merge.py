@@ -0,0 +1,59 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+import io
+
+from PyPDF2 import PdfFileReader, PdfFileWriter
+
+from odoo.tests.common import TransactionCase
+
+from .. import label_merge
+
+
+class TestLabelMerge(TransactionCase):
+    def _pdf(self, *widths):
+        writer = PdfFileWriter()
+        for width in widths:
+            writer.addBlankPage(width, 72)
+        stream = io.BytesIO()
+        writer.write(stream)
+        return stream.getvalue()
+
+    def _page_widths(self, merged):
+        reader = PdfFileReader(io.BytesIO(b"".join(label_merge.iter_file(merged))))
+        return [
+            reader.getPage(page_num).mediaBox.getWidth()
+            for page_num in range(reader.getNumPages())
+        ]
+
+    def test_normalize_file_type(self):
+        self.assertEqual(label_merge.normalize_file_type("ZPL2"), "zpl")
+        self.assertEqual(label_merge.normalize_file_type("PDF"), "pdf")
+        self.assertEqual(label_merge.normalize_file_type(False), "")
+
+    def test_merge_zpl(self):
+        """Test ZPL labels are concatenated by chunks"""
+        chunks = list(
+            label_merge.iter_concatenated([b"^XA^XZ", b"^XA^FD1^FS^XZ"], chunk_size=4)
+        )
+        self.assertEqual(chunks, [b"^XA^", b"XZ", b"^XA^", b"FD1^", b"FS^X", b"Z"])
+
+    def test_merge_pdf(self):
+        """Test PDF labels are merged in one document, in order"""
+        sources = [self._pdf(10, 20), self._pdf(30), self._pdf(40, 50), self._pdf(60)]
+        merged = label_merge.merge_pdf(sources)
+        self.assertEqual(self._page_widths(merged), [10, 20, 30, 40, 50, 60])
+        # merged by batches of 2 documents, then the batches again
+        merged = label_merge.merge_pdf(sources, batch_size=2)
+        self.assertEqual(self._page_widths(merged), [10, 20, 30, 40, 50, 60])
+
+    def test_merge_pickings(self):
+        """Test the pickings are kept in the order of the selection"""
+        pickings = self.env["stock.picking"].search([], limit=2)
+        merge = self.env["delivery.carrier.label.merge"].create(
+            {
+                "label_model": "shipping.label",
+                "picking_list": ",".join(str(i) for i in reversed(pickings.ids)),
+                "filename": "labels",
+            }
+        )
+        self.assertEqual(merge._get_pickings().ids, list(reversed(pickings.ids)))
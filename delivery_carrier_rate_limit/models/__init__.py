@@ -0,0 +1 @@
+from . import delivery_carrier
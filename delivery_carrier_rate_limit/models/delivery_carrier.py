@@ -0,0 +1,65 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import _, exceptions, fields, models
+
+from ..rate_limit import RateLimitExceeded, get_bucket
+
+# maximum seconds waited for the rate limit before giving up
+RATE_LIMIT_TIMEOUT = 60
+
+
+class DeliveryCarrier(models.Model):
+    _inherit = "delivery.carrier"
+
+    rate_limit = fields.Float(
+        string="Requests per Second",
+        help="Maximum number of requests per second sent to the carrier by "
+        "all the workers of the server for this delivery method. 0 means no "
+        "limit.",
+    )
+    rate_limit_burst = fields.Integer(
+        string="Request Burst",
+        default=1,
+        help="Number of requests which can be sent at once when no request "
+        "was sent for a while, without exceeding the requests per second "
+        "on average.",
+    )
+
+    def _get_rate_limited_record(self, account=None):
+        """Return the record whose rate limit applies to the requests
+
+        :param account: optional account used for the requests, modules
+                        adding a limit on accounts return it when set
+        """
+        return self
+
+    def _get_rate_limit_bucket(self, account=None):
+        """Return the rate limiting bucket of the requests to the carrier
+
+        :param account: optional account used for the requests
+        :return: a `TokenBucket` or None when there is no limit
+        """
+        self.ensure_one()
+        limited = self._get_rate_limited_record(account)
+        return get_bucket(
+            (self.env.cr.dbname, limited._name, limited.id),
+            limited.rate_limit,
+            limited.rate_limit_burst,
+        )
+
+    def _wait_rate_limit(self, account=None):
+        """Wait until a request can be sent to the carrier"""
+        bucket = self._get_rate_limit_bucket(account)
+        if not bucket:
+            return
+        try:
+            bucket.acquire(RATE_LIMIT_TIMEOUT)
+        except RateLimitExceeded:
+            raise exceptions.UserError(
+                _(
+                    "Too many requests are sent to %s at the moment. "
+                    "Please retry later."
+                )
+                % self.name
+            )
@@ -0,0 +1,113 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+"""Token bucket limiting the rate of the calls to the carriers' APIs
+
+The state of a bucket is kept in a small file locked with `flock`, so all
+the prefork workers, crons and threads of a server draw their requests
+from the same bucket and stay under the quota of the API together.
+
+Buckets are configured on the delivery methods, or on any record having
+the same `rate_limit` and `rate_limit_burst` fields, like carrier accounts.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from odoo.tools import config
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+class RateLimitExceeded(Exception):
+    """Raised when no request could be made in the allowed time"""
+
+
+class TokenBucket(object):
+    """Allow `rate` requests per second, with bursts up to `capacity`
+
+    :param path: file holding the state of the bucket
+    """
+
+    def __init__(self, path, rate, capacity):
+        self.path = path
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        # flock does not serialize the threads sharing a file descriptor
+        self._lock = threading.Lock()
+
+    def _take(self, now):
+        """Take a token if available
+
+        :return: 0 when a token was taken, else the seconds to wait for one
+        """
+        with self._lock, open(self.path, "a+") as state_file:
+            if fcntl:
+                fcntl.flock(state_file, fcntl.LOCK_EX)
+            state_file.seek(0)
+            try:
+                tokens, updated_at = map(float, state_file.read().split())
+            except ValueError:
+                tokens, updated_at = self.capacity, now
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.rate)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            state_file.seek(0)
+            state_file.truncate()
+            state_file.write("%r %r" % (tokens, now))
+            return wait
+
+    def acquire(self, timeout=None):
+        """Wait until a request can be made
+
+        :param timeout: maximum seconds to wait, no limit when None
+        :raise RateLimitExceeded: when the timeout is reached
+        """
+        deadline = timeout is not None and time.time() + timeout
+        while True:
+            now = time.time()
+            wait = self._take(now)
+            if not wait:
+                return
+            if deadline and now + wait > deadline:
+                raise RateLimitExceeded(self.path)
+            time.sleep(wait)
+
+
+def _get_directory():
+    directory = os.path.join(
+        config.get("data_dir") or tempfile.gettempdir(), "carrier_rate_limit"
+    )
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def get_bucket(key, rate, capacity):
+    """Return the bucket shared by the processes of the server for a key
+
+    :param key: tuple identifying the bucket, e.g. (dbname, model, id)
+    :param rate: requests per second, no bucket when 0
+    :param capacity: maximum burst of requests
+    :return: a `TokenBucket` or None
+    """
+    if not rate or rate <= 0:
+        return None
+    name = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+    with _buckets_lock:
+        bucket = _buckets.get(name)
+        if bucket is None:
+            path = os.path.join(_get_directory(), name)
+            bucket = _buckets[name] = TokenBucket(path, rate, capacity)
+        bucket.rate = rate
+        bucket.capacity = max(capacity, 1)
+        return bucket
@@ -0,0 +1 @@
+from . import test_rate_limit
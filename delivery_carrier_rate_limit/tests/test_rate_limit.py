@@ -0,0 +1,62 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from odoo.exceptions import UserError
+from odoo.tests.common import TransactionCase
+
+from .. import rate_limit
+
+
+class TestRateLimit(TransactionCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "bucket")
+        self.now = 1000.0
+        patcher = mock.patch.object(rate_limit.time, "time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _sleep(self, seconds):
+        self.now += seconds
+
+    def test_token_bucket(self):
+        bucket = rate_limit.TokenBucket(self.path, rate=2, capacity=2)
+        with mock.patch.object(rate_limit.time, "sleep", self._sleep):
+            bucket.acquire()
+            bucket.acquire()
+            self.assertEqual(self.now, 1000.0)
+            # the burst is consumed, wait for the next token
+            bucket.acquire()
+            self.assertEqual(self.now, 1000.5)
+        # the state is shared by the buckets using the same file
+        other = rate_limit.TokenBucket(self.path, rate=2, capacity=2)
+        with self.assertRaises(rate_limit.RateLimitExceeded):
+            other.acquire(timeout=0.1)
+
+    def test_no_bucket_without_rate(self):
+        self.assertIsNone(rate_limit.get_bucket(("db", "delivery.carrier", 1), 0, 1))
+
+    def test_carrier_bucket(self):
+        carrier = self.env.ref("delivery.normal_delivery_carrier")
+        self.assertIsNone(carrier._get_rate_limit_bucket())
+        carrier.write({"rate_limit": 5, "rate_limit_burst": 2})
+        bucket = carrier._get_rate_limit_bucket()
+        self.assertEqual((bucket.rate, bucket.capacity), (5, 2))
+        self.assertEqual(
+            bucket.path,
+            rate_limit.get_bucket(
+                (self.env.cr.dbname, "delivery.carrier", carrier.id), 5, 2
+            ).path,
+        )
+        with mock.patch.object(
+            rate_limit.TokenBucket,
+            "acquire",
+            side_effect=rate_limit.RateLimitExceeded,
+        ), self.assertRaises(UserError):
+            carrier._wait_rate_limit()
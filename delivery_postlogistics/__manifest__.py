@@ -9,13 +9,20 @@
     "license": "AGPL-3",
     "category": "Delivery",
     "complexity": "normal",
-    "depends": ["delivery", "mail", "base"],
+    "depends": [
+        "delivery",
+        "delivery_carrier_label_merge",
+        "delivery_carrier_rate_limit",
+        "mail",
+        "base",
+    ],
     "website": "https://github.com/OCA/delivery-carrier",
     "data": [
         "security/ir.model.access.csv",
         "data/partner.xml",
         "data/product.xml",
         "data/delivery.xml",
+        "data/ir_cron.xml",
         "views/delivery.xml",
         "views/product_packaging.xml",
         "views/stock_quant_package_view.xml",
@@ -2,7 +2,9 @@ from . import postlogistics_carrier_template_options
 from . import delivery_carrier
 from . import product_packaging
 from . import postlogistics_license
+from . import postlogistics_access_token
 from . import postlogistics_shipping_label
+from . import postlogistics_label_cache
 from . import stock_picking
 from . import stock_quant_package
 from . import stock_move
@@ -31,6 +31,72 @@ class DeliveryCarrier(models.Model):
     postlogistics_client_secret = fields.Char(
         string="Client Secret", groups="base.group_system"
     )
+    postlogistics_shared_token = fields.Boolean(
+        string="Share Access Token",
+        help="Store the access token in the database so that all the "
+        "workers and crons use the same one instead of each requesting "
+        "its own token.",
+    )
+    postlogistics_pool_size = fields.Integer(
+        string="Connection Pool Size",
+        default=10,
+        help="Maximum number of connections kept open to the PostLogistics "
+        "endpoint. Connections are shared by all the label requests of the "
+        "process.",
+    )
+    postlogistics_keep_alive = fields.Boolean(
+        string="Keep-Alive Connections",
+        default=True,
+        help="Reuse the connections to the PostLogistics endpoint between "
+        "requests instead of opening a new one for each label.",
+    )
+    postlogistics_label_concurrency = fields.Integer(
+        string="Parallel Label Requests",
+        default=1,
+        help="Number of package labels of a delivery order requested in "
+        "parallel to PostLogistics. With 1, the labels are requested one "
+        "after the other and the generation stops at the first error.",
+    )
+    postlogistics_resumable_labels = fields.Boolean(
+        string="Resumable Label Runs",
+        help="Request the labels of all the packages even when some of them "
+        "fail. The labels received are kept, the errors are shown on the "
+        "packages and generating the labels again only requests the "
+        "packages without tracking number.",
+    )
+    postlogistics_pregenerate_labels = fields.Boolean(
+        string="Pre-generate Labels",
+        help="Generate the labels in background as soon as the packages of "
+        "a ready delivery order are set, so that sending it to the shipper "
+        "only attaches them. The labels are generated again if the "
+        "packages or the address change.",
+    )
+    postlogistics_max_retries = fields.Integer(
+        string="Retries",
+        default=3,
+        help="Number of times a request is retried when PostLogistics is "
+        "temporarily unavailable or rate limits the requests. Label requests "
+        "are only retried when PostLogistics did not receive or refused them.",
+    )
+    postlogistics_retry_backoff = fields.Float(
+        string="Retry Backoff (s)",
+        default=0.5,
+        help="Base delay before retrying a request, doubled after each "
+        "attempt and randomized.",
+    )
+    postlogistics_circuit_threshold = fields.Integer(
+        string="Failures Before Pausing",
+        default=5,
+        help="After this number of consecutive failed requests, the "
+        "requests to the endpoint fail immediately until the pause is "
+        "over. 0 disables it.",
+    )
+    postlogistics_circuit_reset_timeout = fields.Integer(
+        string="Pause Duration (s)",
+        default=30,
+        help="Time during which requests fail immediately once the endpoint "
+        "has failed too many times in a row.",
+    )
     postlogistics_logo = fields.Binary(
         string="Company Logo on Post labels",
         help="Optional company logo to show on label.\n"
@@ -135,9 +201,8 @@ class DeliveryCarrier(models.Model):
         It will generate the labels for all the packages of the picking.
         Packages are mandatory in this case
         """
-        for pick in pickings:
-            pick._set_a_default_package()
-            pick._generate_postlogistics_label()
+        pickings._set_a_default_package()
+        pickings._generate_postlogistics_labels()
 
         return [{"exact_price": False, "tracking_number": False}]
 
@@ -0,0 +1,68 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+import hashlib
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+
+class PostlogisticsAccessToken(models.Model):
+    """Access tokens shared by all the workers and crons of the database
+
+    Only used by the delivery methods having 'Share Access Token' set.
+    """
+
+    _name = "postlogistics.access.token"
+    _description = "PostLogistics Shared Access Token"
+
+    key = fields.Char(required=True, index=True)
+    access_token = fields.Char(required=True)
+    expiry = fields.Datetime(required=True)
+
+    _sql_constraints = [
+        ("key_uniq", "unique(key)", "An access token already exists for this key.")
+    ]
+
+    @api.model
+    def _get_shared_token(self, key, fetch, min_validity=0):
+        """Return a token stored by any worker or request a new one
+
+        Workers asking a token for the same key are serialized by a
+        PostgreSQL advisory lock, so only one of them calls the API.
+        The current cursor is committed: it must be dedicated to this call.
+
+        :param key: tuple (endpoint url, client id, scope)
+        :param fetch: function requesting a new token to the API
+        :param min_validity: seconds a stored token must still be valid
+        :return: the token response {"access_token": ..., "expires_in": ...}
+        """
+        digest = hashlib.sha256("|".join(map(str, key)).encode("utf-8")).digest()
+        lock_id = int.from_bytes(digest[:8], "big", signed=True)
+        cr = self.env.cr
+        cr.execute("SELECT pg_advisory_lock(%s)", (lock_id,))
+        try:
+            # start a new transaction, to see the token stored by the
+            # worker which held the lock before us
+            cr.commit()  # pylint: disable=invalid-commit
+            token = self.search([("key", "=", digest.hex())], limit=1)
+            now = fields.Datetime.now()
+            if token and token.expiry > now + timedelta(seconds=min_validity):
+                return {
+                    "access_token": token.access_token,
+                    "expires_in": int((token.expiry - now).total_seconds()),
+                }
+            response = fetch()
+            if response.get("access_token"):
+                vals = {
+                    "access_token": response["access_token"],
+                    "expiry": now + timedelta(seconds=response["expires_in"]),
+                }
+                if token:
+                    token.write(vals)
+                else:
+                    self.create(dict(vals, key=digest.hex()))
+                cr.commit()  # pylint: disable=invalid-commit
+            return response
+        finally:
+            cr.rollback()
+            cr.execute("SELECT pg_advisory_unlock(%s)", (lock_id,))
@@ -0,0 +1,70 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+import base64
+
+from odoo import api, fields, models
+
+
+class PostlogisticsLabelCache(models.Model):
+    """Label generated in advance for a package of a delivery order
+
+    Filled by the pre-generation cron, used and removed when the delivery
+    order is sent to the shipper. The cron purges the labels of the
+    delivery orders which are no longer ready.
+    """
+
+    _name = "postlogistics.label.cache"
+    _description = "PostLogistics Pre-generated Label"
+
+    picking_id = fields.Many2one(
+        comodel_name="stock.picking", required=True, index=True, ondelete="cascade"
+    )
+    fingerprint = fields.Char(required=True)
+    item_id = fields.Char(required=True)
+    tracking_number = fields.Char(required=True)
+    file_type = fields.Char(required=True)
+    label = fields.Binary(attachment=True)
+
+    @api.model
+    def _store_label_results(self, picking, fingerprint, label_results):
+        """Store the successful labels of a picking"""
+        vals_list = []
+        for label in label_results:
+            if "errors" in label:
+                continue
+            for value in label["value"]:
+                vals_list.append(
+                    {
+                        "picking_id": picking.id,
+                        "fingerprint": fingerprint,
+                        "item_id": value["item_id"],
+                        "tracking_number": value["tracking_number"],
+                        "file_type": value["file_type"],
+                        "label": base64.b64encode(value["binary"]),
+                    }
+                )
+        return self.create(vals_list)
+
+    def _to_label_results(self):
+        """Return the labels as results of the web service"""
+        return [
+            {
+                "success": True,
+                "item_id": cache.item_id,
+                "value": [
+                    {
+                        "item_id": cache.item_id,
+                        "binary": base64.b64decode(cache.label),
+                        "tracking_number": cache.tracking_number,
+                        "file_type": cache.file_type,
+                    }
+                ],
+            }
+            for cache in self
+        ]
+
+    @api.model
+    def _purge(self):
+        """Remove the labels of the pickings which are no longer ready"""
+        self.search([("picking_id.state", "!=", "assigned")]).unlink()
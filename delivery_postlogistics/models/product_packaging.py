@@ -1,7 +1,7 @@
 # Copyright 2013-2016 Camptocamp SA
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
-from odoo import fields, models
+from odoo import fields, models, tools
 
 
 class ProductPackaging(models.Model):
@@ -11,9 +11,26 @@ class ProductPackaging(models.Model):
         selection_add=[("postlogistics", "PostLogistics")]
     )
 
+    @tools.ormcache("self.id")
+    def _get_parsed_packaging_codes(self):
+        """
+        Return the packaging codes, parsed once per packaging
+
+        :return: tuple (ordered tuple of codes, frozenset of codes)
+        """
+        self.ensure_one()
+        codes = (code.strip() for code in (self.shipper_package_code or "").split(","))
+        codes = tuple(code for code in codes if code)
+        return codes, frozenset(codes)
+
     def _get_packaging_codes(self):
         """
         Return the list of packaging codes
         """
-        self.ensure_one()
-        return [code.strip() for code in self.shipper_package_code.split(",")]
+        return list(self._get_parsed_packaging_codes()[0])
+
+    def write(self, vals):
+        res = super().write(vals)
+        if "shipper_package_code" in vals:
+            self.clear_caches()
+        return res
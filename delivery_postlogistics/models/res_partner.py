@@ -3,6 +3,8 @@
 
 from odoo import fields, models
 
+from ..postlogistics.web_service import PostlogisticsWebService
+
 
 class ResPartner(models.Model):
     _inherit = "res.partner"
@@ -24,3 +26,10 @@ class ResPartner(models.Model):
         ],
         default="disabled",
     )
+
+    def write(self, vals):
+        res = super().write(vals)
+        PostlogisticsWebService._payload_cache.invalidate(
+            self.env.cr.dbname, set(self.ids)
+        )
+        return res
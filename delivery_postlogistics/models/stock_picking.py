@@ -1,11 +1,14 @@
 # Copyright 2013-2016 Camptocamp SA
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
-import base64
-from operator import attrgetter
+import logging
+from collections import defaultdict
 
 from odoo import _, exceptions, fields, models
 
-from ..postlogistics.web_service import PostlogisticsWebService
+from ..postlogistics import metrics
+from ..postlogistics.web_service import PostlogisticsWebService, _compile_itemid
+
+_logger = logging.getLogger(__name__)
 
 
 class StockPicking(models.Model):
@@ -26,26 +29,46 @@ class StockPicking(models.Model):
         "Mobile", help="For notify delivery by telephone (ZAW3213)"
     )
 
-    def _get_packages_from_picking(self):
-        """ Get all the packages from the picking """
-        self.ensure_one()
-        operation_obj = self.env["stock.move.line"]
-        operations = operation_obj.search(
-            [
-                "|",
-                ("package_id", "!=", False),
-                ("result_package_id", "!=", False),
-                ("picking_id", "=", self.id),
-            ]
+    def _get_packages_by_picking(self):
+        """Get the packages of many pickings at once
+
+        :return: dict {picking id: packages ordered by name}
+        """
+        packages_by_picking = {
+            picking.id: self.env["stock.quant.package"] for picking in self
+        }
+        if not self.ids:
+            return packages_by_picking
+        self.env["stock.move.line"].flush(
+            ["picking_id", "package_id", "result_package_id"]
+        )
+        self.env["stock.quant.package"].flush(["name"])
+        # Take the destination package. If empty, the package is
+        # moved so take the source one.
+        self.env.cr.execute(
+            """
+            SELECT DISTINCT line.picking_id, package.id, package.name
+            FROM stock_move_line line
+            JOIN stock_quant_package package
+                ON package.id = COALESCE(line.result_package_id, line.package_id)
+            WHERE line.picking_id IN %s
+            ORDER BY line.picking_id, package.name, package.id
+            """,
+            (tuple(self.ids),),
         )
-        package_ids = set()
-        for operation in operations:
-            # Take the destination package. If empty, the package is
-            # moved so take the source one.
-            package_ids.add(operation.result_package_id.id or operation.package_id.id)
+        package_ids = defaultdict(list)
+        for picking_id, package_id, __ in self.env.cr.fetchall():
+            package_ids[picking_id].append(package_id)
+        for picking_id, ids in package_ids.items():
+            packages_by_picking[picking_id] = self.env["stock.quant.package"].browse(
+                ids
+            )
+        return packages_by_picking
 
-        packages = self.env["stock.quant.package"].browse(package_ids)
-        return packages
+    def _get_packages_from_picking(self):
+        """ Get all the packages from the picking, ordered by name """
+        self.ensure_one()
+        return self._get_packages_by_picking()[self.id]
 
     def get_shipping_label_values(self, label):
         self.ensure_one()
@@ -53,14 +76,25 @@ class StockPicking(models.Model):
             "name": label["name"],
             "res_id": self.id,
             "res_model": "stock.picking",
-            "datas": label["file"],
+            "raw": label["raw"],
             "file_type": label["file_type"],
         }
 
     def attach_shipping_label(self, label):
         """Attach a label returned by generate_shipping_labels to a picking"""
         self.ensure_one()
-        data = self.get_shipping_label_values(label)
+        return self._attach_postlogistics_labels([(self, label)])
+
+    def _attach_postlogistics_labels(self, picking_labels):
+        """Attach labels to their pickings at once
+
+        :param picking_labels: list of tuples (picking, label)
+        :return: the created postlogistics.shipping.label records
+        """
+        data_list = [
+            picking.get_shipping_label_values(label)
+            for picking, label in picking_labels
+        ]
         context_attachment = self.env.context.copy()
         # remove default_type setted for stock_picking
         # as it would try to define default value of attachement
@@ -69,7 +103,7 @@ class StockPicking(models.Model):
         return (
             self.env["postlogistics.shipping.label"]
             .with_context(context_attachment)
-            .create(data)
+            .create(data_list)
         )
 
     def _set_a_default_package(self):
@@ -126,19 +160,24 @@ class StockPicking(models.Model):
         return order.amount_total
 
     def info_from_label(self, label, zpl_patch_string=False):
+        """Return the attachment values of a label returned by the API
+
+        The label is kept as raw bytes, without base64 round-trip, up to
+        the attachment storage.
+        """
         tracking_number = label["tracking_number"]
-        data = base64.b64decode(label["binary"])
+        data = label["binary"]
 
         # Apply patch for zpl file
         if label["file_type"] == "zpl2" and zpl_patch_string:
-            data = base64.b64encode(
-                base64.b64decode(data)
+            data = (
+                bytes(data)
                 .decode("cp437")
                 .replace("^XA", zpl_patch_string)
                 .encode("utf-8")
             )
         return {
-            "file": data,
+            "raw": data,
             "file_type": label["file_type"],
             "name": tracking_number + "." + label["file_type"],
         }
@@ -161,30 +200,76 @@ class StockPicking(models.Model):
             label = label_result[0]["value"][0]
             self.carrier_tracking_ref = label["tracking_number"]
             labels.append(self.info_from_label(label, zpl_patch_string))
+            return labels
+
+        # index the labels by the package part of their item id, the
+        # package names are sanitized the same way in the item ids
+        labels_by_package = defaultdict(list)
+        for label in label_result:
+            for label_value in label["value"]:
+                item_id = label_value["item_id"]
+                if "+" in item_id:
+                    labels_by_package[item_id.rsplit("+", 1)[-1]].append(label_value)
 
         tracking_refs = []
+        packages_by_tracking = defaultdict(list)
         for package in packages:
-            tracking_numbers = []
-            for label in label_result:
-                for label_value in label["value"]:
-                    if package.name in label_value["item_id"].split("+")[-1]:
-                        tracking_numbers.append(label_value["tracking_number"])
-                        labels.append(
-                            self.info_from_label(label_value, zpl_patch_string)
-                        )
-            package.parcel_tracking = "; ".join(tracking_numbers)
+            package_labels = labels_by_package.get(
+                _compile_itemid.sub("", package.name or ""), []
+            )
+            tracking_numbers = [value["tracking_number"] for value in package_labels]
+            labels += [
+                self.info_from_label(value, zpl_patch_string)
+                for value in package_labels
+            ]
+            packages_by_tracking["; ".join(tracking_numbers)].append(package.id)
             tracking_refs += tracking_numbers
 
+        package_model = self.env["stock.quant.package"]
+        for parcel_tracking, package_ids in packages_by_tracking.items():
+            vals = {"parcel_tracking": parcel_tracking}
+            if parcel_tracking:
+                vals["postlogistics_label_error"] = False
+            package_model.browse(package_ids).write(vals)
+
         existing_tracking_ref = (
             self.carrier_tracking_ref and self.carrier_tracking_ref.split("; ") or []
         )
         self.carrier_tracking_ref = "; ".join(existing_tracking_ref + tracking_refs)
         return labels
 
+    def write_label_errors(self, label_result, packages):
+        """Record the errors of the failed labels on their package
+
+        The results are matched to the packages by item id, like in
+        `write_tracking_number_label`.
+
+        :return: list of error messages, prefixed by the package name
+        """
+        packages_by_name = {
+            _compile_itemid.sub("", package.name or ""): package for package in packages
+        }
+        messages = []
+        for label in label_result:
+            item_id = label.get("item_id") or ""
+            package = "+" in item_id and packages_by_name.get(
+                item_id.rsplit("+", 1)[-1]
+            )
+            if package:
+                package.postlogistics_label_error = label["errors"]
+                messages.append("%s: %s" % (package.name, label["errors"]))
+            else:
+                messages.append(label["errors"])
+        return messages
+
     def _generate_postlogistics_label(
         self, webservice_class=None, package_ids=None, skip_attach_file=False
     ):
-        """ Generate labels and write tracking numbers received """
+        """Generate labels and write tracking numbers received
+
+        The labels generated in advance for the picking are used when they
+        are still valid, and removed in any case.
+        """
         self.ensure_one()
         user = self.env.user
         company = user.company_id
@@ -193,7 +278,6 @@ class StockPicking(models.Model):
 
         if package_ids is None:
             packages = self._get_packages_from_picking()
-            packages = packages.sorted(key=attrgetter("name"))
         else:
             # restrict on the provided packages
             package_obj = self.env["stock.quant.package"]
@@ -204,7 +288,14 @@ class StockPicking(models.Model):
         # Do not generate label for packages that are already done
         packages = packages.filtered(lambda p: not p.parcel_tracking)
 
-        label_results = web_service.generate_label(self, packages)
+        (
+            label_results,
+            to_request,
+            pregenerated_labels,
+        ) = self._get_postlogistics_pregenerated_labels(web_service, [(self, packages)])
+        label_results = label_results[self.id]
+        if to_request:
+            label_results += web_service.generate_label(*to_request[0])
 
         # Process the success packages first
         success_label_results = [
@@ -215,22 +306,240 @@ class StockPicking(models.Model):
         # Case when there is a failed label, rollback odoo data
         if failed_label_results:
             self._cr.rollback()
+        pregenerated_labels.unlink()
 
-        labels = self.write_tracking_number_label(success_label_results, packages)
+        with metrics.timer(metrics.TRACKING_WRITE, picking=self.id):
+            labels = self.write_tracking_number_label(success_label_results, packages)
+        error_messages = self.write_label_errors(failed_label_results, packages)
 
         if not skip_attach_file:
-            for label in labels:
-                self.attach_shipping_label(label)
+            with metrics.timer(
+                metrics.ATTACHMENT_CREATE, picking=self.id, labels=len(labels)
+            ):
+                self._attach_postlogistics_labels([(self, label) for label in labels])
 
         if failed_label_results:
             # Commit the change to save the changes,
             # This ensures the label pushed recored correctly in Odoo
             self._cr.commit()  # pylint: disable=invalid-commit
-            error_message = "\n".join(label["errors"] for label in failed_label_results)
-            raise exceptions.Warning(error_message)
+            raise exceptions.Warning("\n".join(error_messages))
         return labels
 
+    def _generate_postlogistics_labels(
+        self, webservice_class=None, skip_attach_file=False
+    ):
+        """Generate labels and write tracking numbers for many pickings
+
+        Recordset counterpart of `_generate_postlogistics_label`: the
+        requests of all the packages of all the pickings are sent through
+        one pooled, concurrent pipeline and the labels are attached at once.
+        """
+        if not self:
+            return []
+        company = self.env.user.company_id
+        if webservice_class is None:
+            webservice_class = PostlogisticsWebService
+
+        # prefetch what the payloads are built from
+        self.mapped("partner_id.parent_id")
+        self.mapped("company_id.partner_id")
+        self.mapped("carrier_id.postlogistics_license_id")
+
+        picking_packages = []
+        all_packages = self.env["stock.quant.package"]
+        packages_by_picking = self._get_packages_by_picking()
+        for picking in self:
+            packages = packages_by_picking[picking.id]
+            # Do not generate label for packages that are already done
+            packages = packages.filtered(lambda p: not p.parcel_tracking)
+            picking_packages.append((picking, packages))
+            all_packages |= packages
+        all_packages.mapped("packaging_id")
+
+        web_service = webservice_class(company)
+        web_service._load_picking_packages(self, packages_by_picking)
+        (
+            label_results,
+            to_request,
+            pregenerated_labels,
+        ) = self._get_postlogistics_pregenerated_labels(web_service, picking_packages)
+        if to_request:
+            for picking_id, results in web_service.generate_labels(to_request).items():
+                label_results[picking_id] += results
+
+        has_errors = any(
+            "errors" in label
+            for picking_results in label_results.values()
+            for label in picking_results
+        )
+        # Case when there is a failed label, rollback odoo data
+        if has_errors:
+            self._cr.rollback()
+        pregenerated_labels.unlink()
+
+        picking_labels = []
+        error_messages = []
+        for picking, packages in picking_packages:
+            success_label_results = [
+                label for label in label_results[picking.id] if "errors" not in label
+            ]
+            failed_label_results = [
+                label for label in label_results[picking.id] if "errors" in label
+            ]
+            with metrics.timer(metrics.TRACKING_WRITE, picking=picking.id):
+                labels = picking.write_tracking_number_label(
+                    success_label_results, packages
+                )
+            picking_labels += [(picking, label) for label in labels]
+            error_messages += [
+                "%s: %s" % (picking.name, message)
+                for message in picking.write_label_errors(
+                    failed_label_results, packages
+                )
+            ]
+
+        if not skip_attach_file:
+            with metrics.timer(
+                metrics.ATTACHMENT_CREATE,
+                pickings=len(self),
+                labels=len(picking_labels),
+            ):
+                self._attach_postlogistics_labels(picking_labels)
+
+        if error_messages:
+            # Commit the change to save the changes,
+            # This ensures the label pushed recored correctly in Odoo
+            self._cr.commit()  # pylint: disable=invalid-commit
+            raise exceptions.Warning("\n".join(error_messages))
+        return [label for __, label in picking_labels]
+
+    def _get_postlogistics_pregenerated_labels(self, web_service, picking_packages):
+        """Use the labels generated in advance for the packages
+
+        Labels generated for a picking whose packages or address changed
+        since are not used.
+
+        :param picking_packages: list of tuples (picking, packages)
+        :return: tuple (dict {picking id: label results generated in advance},
+                        list of tuples (picking, packages) still to request,
+                        pre-generated labels of the pickings, to remove)
+        """
+        label_results = {picking.id: [] for picking, __ in picking_packages}
+        cache_model = self.env["postlogistics.label.cache"]
+        pregenerated_labels = cache_model.search([("picking_id", "in", self.ids)])
+        if not pregenerated_labels:
+            return label_results, picking_packages, pregenerated_labels
+        labels_by_picking = defaultdict(list)
+        for label in pregenerated_labels:
+            labels_by_picking[label.picking_id.id].append(label.id)
+
+        to_request = []
+        for picking, packages in picking_packages:
+            labels = cache_model.browse(labels_by_picking.get(picking.id, []))
+            if (
+                not labels
+                or not packages
+                or labels[0].fingerprint
+                != web_service.get_label_fingerprint(picking, packages)
+            ):
+                to_request.append((picking, packages))
+                continue
+            label_results[picking.id] = labels._to_label_results()
+            item_ids = set(labels.mapped("item_id"))
+            packages = packages.filtered(
+                lambda p: web_service._get_itemid(picking, p.name) not in item_ids
+            )
+            if packages:
+                to_request.append((picking, packages))
+        return label_results, to_request, pregenerated_labels
+
+    def _postlogistics_pregenerate_labels(self, webservice_class=None):
+        """Generate in advance the labels of pickings having packages
+
+        The labels are kept in `postlogistics.label.cache` with the
+        fingerprint of their picking, to be attached when the picking is
+        sent to the shipper. Failed labels are requested again at that time.
+        """
+        company = self.env.user.company_id
+        if webservice_class is None:
+            webservice_class = PostlogisticsWebService
+        web_service = webservice_class(company)
+        cache_model = self.env["postlogistics.label.cache"]
+        pregenerated_labels = cache_model.search([("picking_id", "in", self.ids)])
+        fingerprints = {
+            label.picking_id.id: label.fingerprint for label in pregenerated_labels
+        }
+
+        packages_by_picking = self._get_packages_by_picking()
+        web_service._load_picking_packages(self, packages_by_picking)
+        picking_packages = []
+        for picking in self:
+            packages = packages_by_picking[picking.id].filtered(
+                lambda p: not p.parcel_tracking
+            )
+            if not packages:
+                continue
+            try:
+                fingerprint = web_service.get_label_fingerprint(picking, packages)
+            except exceptions.UserError as error:
+                # reported to the user when the picking is sent
+                _logger.info("Labels of %s not pre-generated: %s", picking.name, error)
+                continue
+            if fingerprints.get(picking.id) == fingerprint:
+                continue
+            fingerprints[picking.id] = fingerprint
+            picking_packages.append((picking, packages))
+        if not picking_packages:
+            return
+        outdated_picking_ids = {picking.id for picking, __ in picking_packages}
+        pregenerated_labels.filtered(
+            lambda label: label.picking_id.id in outdated_picking_ids
+        ).unlink()
+
+        label_results = web_service.generate_labels(picking_packages)
+        for picking, __ in picking_packages:
+            cache_model._store_label_results(
+                picking, fingerprints[picking.id], label_results[picking.id]
+            )
+
+    def _cron_postlogistics_pregenerate_labels(self, batch_size=50):
+        """Pre-generate the labels of the ready PostLogistics pickings"""
+        self.env["postlogistics.label.cache"]._purge()
+        carriers = self.env["delivery.carrier"].search(
+            [
+                ("delivery_type", "=", "postlogistics"),
+                ("postlogistics_pregenerate_labels", "=", True),
+            ]
+        )
+        if not carriers:
+            return
+        pickings = self.search(
+            [
+                ("state", "=", "assigned"),
+                ("carrier_tracking_ref", "=", False),
+                ("carrier_id", "in", carriers.ids),
+            ]
+        )
+        for start in range(0, len(pickings), batch_size):
+            pickings[start : start + batch_size]._postlogistics_pregenerate_labels()
+            # keep the labels received, they cannot be requested twice
+            # without getting new tracking numbers
+            self.env.cr.commit()  # pylint: disable=invalid-commit
+
+    def unlink(self):
+        # remove the label files along with the pre-generated labels
+        self.env["postlogistics.label.cache"].search(
+            [("picking_id", "in", self.ids)]
+        ).unlink()
+        return super().unlink()
+
     def generate_postlogistics_shipping_labels(self, package_ids=None):
         """ Add label generation for PostLogistics """
         self.ensure_one()
         return self._generate_postlogistics_label(package_ids=package_ids)
+
+    def action_download_merged_postlogistics_labels(self):
+        """Download the PostLogistics labels of the pickings as one document"""
+        return self._action_download_merged_labels(
+            "postlogistics.shipping.label", "postlogistics_labels"
+        )
@@ -1,5 +1,7 @@
 # Copyright 2013-2016 Camptocamp SA
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+from collections import defaultdict
+
 from odoo import _, api, exceptions, fields, models
 
 
@@ -12,6 +14,9 @@ class StockQuantPackage(models.Model):
         "than the total of the sales order, write the amount there.",
     )
     parcel_tracking = fields.Char("Parcel Tracking")
+    postlogistics_label_error = fields.Text(
+        string="PostLogistics Label Error", readonly=True, copy=False
+    )
     package_carrier_type = fields.Selection(
         related="packaging_id.package_carrier_type",
         string="Packaging's Carrier",
@@ -37,10 +42,44 @@ class StockQuantPackage(models.Model):
         cash on delivery amount.
         """
         self.ensure_one()
-        if self.postlogistics_manual_cod_amount:
-            return self.postlogistics_manual_cod_amount
+        return self._postlogistics_cod_amounts()[self.id]
+
+    def _postlogistics_cod_amounts(self):
+        """Return the PostLogistics Cash on Delivery amounts of packages
+
+        Batched version of `postlogistics_cod_amount`: the origin pickings
+        of all the packages are read at once.
 
-        pickings = self._get_origin_pickings()
+        :return: dict {package id: amount}
+        """
+        amounts = {
+            package.id: package.postlogistics_manual_cod_amount
+            for package in self
+            if package.postlogistics_manual_cod_amount
+        }
+        todo = self.filtered(lambda p: p.id not in amounts)
+        if not todo:
+            return amounts
+        move_lines = self.env["stock.move.line"].search(
+            [("package_id", "in", todo.ids)]
+        )
+        picking_ids = defaultdict(set)
+        for move_line in move_lines:
+            picking_ids[move_line.package_id.id].add(move_line.picking_id.id)
+        picking_model = self.env["stock.picking"]
+        # prefetch the sales orders and their pickings of all the packages
+        move_lines.mapped("picking_id.sale_id.picking_ids")
+        for package in todo:
+            pickings = picking_model.browse(picking_ids[package.id])
+            amounts[package.id] = package._postlogistics_cod_amount_from_pickings(
+                pickings.mapped("sale_id.picking_ids")
+            )
+        return amounts
+
+    def _postlogistics_cod_amount_from_pickings(self, pickings):
+        """Return the Cash on Delivery amount of a package from its origin
+        pickings, as returned by `_get_origin_pickings`
+        """
         if len(pickings) > 1:
             raise exceptions.Warning(
                 _(
@@ -0,0 +1,128 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+"""Timing of the phases of the PostLogistics label generation
+
+Each phase (token fetch, payload preparation, HTTP call, response decode,
+tracking write, attachment creation) is timed with `timer`. Durations are
+logged as structured debug records on this module's logger and collected
+in an in-process histogram registry, which `export_text` dumps in the
+Prometheus text format.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+_logger = logging.getLogger(__name__)
+
+METRIC_NAME = "postlogistics_label_phase_seconds"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+TOKEN_FETCH = "token_fetch"
+PREPARE_CUSTOMER = "prepare_customer"
+PREPARE_RECIPIENT = "prepare_recipient"
+PREPARE_ITEM_LIST = "prepare_item_list"
+HTTP_CALL = "http_call"
+RESPONSE_DECODE = "response_decode"
+TRACKING_WRITE = "tracking_write"
+ATTACHMENT_CREATE = "attachment_create"
+
+
+class Histogram(object):
+    """Cumulative histogram of durations, in seconds"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Registry(object):
+    """Histograms of the phase durations, safe to use from threads"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, phase, duration):
+        with self._lock:
+            histogram = self._histograms.get(phase)
+            if histogram is None:
+                histogram = self._histograms[phase] = Histogram(self.buckets)
+            histogram.observe(duration)
+
+    def get(self, phase):
+        """Return (count, sum) of the durations of a phase"""
+        with self._lock:
+            histogram = self._histograms.get(phase)
+            if histogram is None:
+                return 0, 0.0
+            return histogram.count, histogram.sum
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def export_text(self):
+        """Dump the histograms in the Prometheus text exposition format"""
+        lines = [
+            "# HELP %s Duration of the PostLogistics label generation phases"
+            % METRIC_NAME,
+            "# TYPE %s histogram" % METRIC_NAME,
+        ]
+        with self._lock:
+            for phase in sorted(self._histograms):
+                histogram = self._histograms[phase]
+                cumulated = 0
+                bounds = [repr(float(b)) for b in histogram.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, histogram.counts):
+                    cumulated += count
+                    lines.append(
+                        '%s_bucket{phase="%s",le="%s"} %d'
+                        % (METRIC_NAME, phase, bound, cumulated)
+                    )
+                lines.append(
+                    '%s_sum{phase="%s"} %.6f' % (METRIC_NAME, phase, histogram.sum)
+                )
+                lines.append(
+                    '%s_count{phase="%s"} %d' % (METRIC_NAME, phase, histogram.count)
+                )
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+@contextmanager
+def timer(phase, **context):
+    """Time the enclosed block as one occurrence of `phase`
+
+    :param phase: name of the phase, one of the constants of this module
+    :param context: extra fields of the log record, e.g. picking or count
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        registry.observe(phase, duration)
+        if _logger.isEnabledFor(logging.DEBUG):
+            fields = dict(context, phase=phase, duration=round(duration, 6))
+            _logger.debug(
+                "postlogistics phase %s",
+                " ".join("%s=%s" % item for item in sorted(fields.items())),
+                extra={"postlogistics_metrics": fields},
+            )
+
+
+def export_text():
+    """Dump the histograms of the shared registry"""
+    return registry.export_text()
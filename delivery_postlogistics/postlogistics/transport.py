@@ -0,0 +1,229 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+"""HTTP plumbing shared by the PostLogistics web service
+
+Sessions are pooled per endpoint so that the TCP and TLS connections to
+the API are kept alive and reused between labels, requests and threads.
+
+Calls are retried on transient errors and guarded by a circuit breaker per
+endpoint, so a degraded API fails fast instead of holding the workers.
+Calls which are not idempotent, like the creation of a label, are only
+retried when the server did not process the request.
+Each attempt can also wait for a token of a rate limiting bucket.
+"""
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+DEFAULT_POOL_SIZE = 10
+# statuses worth retrying: rate limited or temporarily unavailable
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# statuses meaning the request was refused without being processed
+SAFE_RETRY_STATUSES = frozenset({429, 503})
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit is open"""
+
+
+class CircuitBreaker(object):
+    """Stop calling an endpoint after consecutive failures
+
+    Once `failure_threshold` consecutive calls failed, the circuit opens and
+    calls fail immediately. After `reset_timeout` seconds, one call is let
+    through: the circuit closes again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at >= self.reset_timeout:
+                # let one trial call through, the others keep failing fast
+                self._opened_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class RetryPolicy(object):
+    """How a call is retried and which circuit breaker guards it
+
+    :param max_retries: number of retries after the first attempt
+    :param backoff: base delay in seconds, doubled at each retry
+    :param max_backoff: maximum delay between two attempts
+    :param breaker: optional `CircuitBreaker` of the endpoint
+    :param bucket: optional `TokenBucket` of delivery_carrier_rate_limit
+        limiting the attempts
+    :param rate_limit_timeout: maximum seconds to wait for the bucket
+    :param idempotent: when False, the call is only retried when the
+        request did not reach the server or was refused by it, as the
+        server may have processed a request which timed out
+    """
+
+    def __init__(
+        self,
+        max_retries=0,
+        backoff=0.5,
+        max_backoff=30.0,
+        breaker=None,
+        bucket=None,
+        rate_limit_timeout=60,
+        idempotent=True,
+    ):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker
+        self.bucket = bucket
+        self.rate_limit_timeout = rate_limit_timeout
+        self.idempotent = idempotent
+
+    def is_retryable_error(self, error):
+        """Return whether the call can be retried after a connection error"""
+        if self.idempotent:
+            return True
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        # the connection to the server could not be established
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+
+    def is_retryable_status(self, status_code):
+        """Return whether the call can be retried after a response"""
+        if self.idempotent:
+            return status_code in RETRY_STATUSES
+        return status_code in SAFE_RETRY_STATUSES
+
+    def get_delay(self, attempt, response=None):
+        """Delay before the next attempt, with full jitter
+
+        The Retry-After header of the response is honoured when present.
+        """
+        retry_after = response is not None and response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+def _new_session(pool_size, keep_alive):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+def get_session(endpoint_url, pool_size=None, keep_alive=True):
+    """Return the session shared by every call made to an endpoint
+
+    :param endpoint_url: base url of the PostLogistics API
+    :param pool_size: maximum number of connections kept open
+    :param keep_alive: when False, connections are closed after each call
+    :return: a `requests.Session`
+    """
+    pool_size = max(pool_size or DEFAULT_POOL_SIZE, 1)
+    key = (endpoint_url, pool_size, bool(keep_alive))
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = _new_session(pool_size, keep_alive)
+        return session
+
+
+def get_circuit_breaker(endpoint_url, failure_threshold, reset_timeout):
+    """Return the circuit breaker shared by every call made to an endpoint"""
+    with _breakers_lock:
+        breaker = _breakers.get(endpoint_url)
+        if breaker is None:
+            breaker = _breakers[endpoint_url] = CircuitBreaker(
+                failure_threshold, reset_timeout
+            )
+        breaker.failure_threshold = failure_threshold
+        breaker.reset_timeout = reset_timeout
+        return breaker
+
+
+def post(session, url, policy=None, **kwargs):
+    """POST with retries on transient errors
+
+    :param session: `requests.Session` to use
+    :param url: url to post to
+    :param policy: `RetryPolicy`, no retry when not provided
+    :param kwargs: passed to `requests.Session.post`
+    :return: the last response received
+    :raise CircuitOpenError: when the circuit of the endpoint is open
+    :raise RateLimitExceeded: when the rate limit did not allow
+        an attempt in time
+    :raise requests.RequestException: when the last attempt could not
+        reach the endpoint
+    """
+    policy = policy or RetryPolicy()
+    breaker = policy.breaker
+    attempt = 0
+    while True:
+        if breaker and not breaker.allow():
+            raise CircuitOpenError(url)
+        if policy.bucket:
+            policy.bucket.acquire(policy.rate_limit_timeout)
+        try:
+            response = session.post(url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as error:
+            if breaker:
+                breaker.record_failure()
+            if attempt >= policy.max_retries or not policy.is_retryable_error(error):
+                raise
+            response = None
+        else:
+            status = response.status_code
+            if breaker:
+                if status >= 500:
+                    breaker.record_failure()
+                elif status != 429:
+                    # throttling is left to the rate limit, it is no outage
+                    breaker.record_success()
+            if (
+                status not in RETRY_STATUSES
+                or attempt >= policy.max_retries
+                or not policy.is_retryable_status(status)
+            ):
+                return response
+        time.sleep(policy.get_delay(attempt, response))
+        attempt += 1
+
+
+def close_sessions():
+    """Close and forget all the pooled sessions"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
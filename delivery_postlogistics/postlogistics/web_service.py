@@ -2,18 +2,24 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 
 import base64
+import hashlib
 import json
 import logging
 import re
 import threading
 import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from io import BytesIO
 
 import requests
-from PIL import Image
 
-from odoo import _, exceptions
+from odoo import SUPERUSER_ID, _, api, exceptions
+
+from odoo.addons.delivery_carrier_rate_limit.rate_limit import RateLimitExceeded
+
+from . import metrics, transport
 
 _logger = logging.getLogger(__name__)
 
@@ -21,6 +27,7 @@ _compile_itemid = re.compile(r"[^0-9A-Za-z+\-_]")
 _compile_itemnum = re.compile(r"[^0-9]")
 AUTH_PATH = "/WEDECOAuth/token"
 GENERATE_LABEL_PATH = "/api/barcode/v1/generateAddressLabel"
+TOKEN_SCOPE = "WEDEC_BARCODE_READ"
 
 DISALLOWED_CHARS_MAPPING = {
     "|": "",
@@ -30,6 +37,52 @@ DISALLOWED_CHARS_MAPPING = {
     "\u2018": "'",
     "\u2019": "'",
 }
+DISALLOWED_CHARS_TABLE = str.maketrans(DISALLOWED_CHARS_MAPPING)
+
+
+class PayloadCache(object):
+    """Bounded cache of the address blocks of the label requests
+
+    Entries are keyed by a tuple starting with the database name and the
+    partner id, and are only used while their stamp (write dates, ...)
+    is unchanged.
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, stamp, build):
+        """Return a copy of the cached block or build and cache it
+
+        :param build: function returning the block
+        """
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == stamp:
+                self._entries.move_to_end(key)
+                return dict(cached[1])
+        value = build()
+        with self._lock:
+            self._entries[key] = (stamp, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return dict(value)
+
+    def invalidate(self, dbname, partner_ids):
+        """Drop the blocks of partners, their write date does not change
+        when they are modified twice in the same transaction
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == dbname and key[1] in partner_ids:
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
 
 
 class PostlogisticsWebService(object):
@@ -46,12 +99,28 @@ class PostlogisticsWebService(object):
 
     """
 
-    access_token = False
-    access_token_expiry = False
+    # seconds before the expiry from which a token is not used anymore
+    access_token_expiry_margin = 5
+    # seconds before the expiry from which a token is renewed in background
+    access_token_refresh_margin = 60
+
+    # tokens are cached per (endpoint url, client id, scope)
+    _access_tokens = {}
+    _access_token_locks = {}
+    _access_token_refreshing = set()
     _lock = threading.Lock()
 
+    # (dbname, carrier id): (attachment checksum, logo, logo format)
+    _logo_cache = {}
+    # recipient and customer blocks
+    _payload_cache = PayloadCache()
+
     def __init__(self, company):
         self.default_lang = company.partner_id.lang or "en"
+        # {picking id: all the packages of the picking}, numbering the parcels
+        self._picking_packages = {}
+        # {package id: cash on delivery amount, None when it has none}
+        self._cod_amounts = {}
 
     def _get_language(self, lang):
         """Return a language to iso format from odoo format.
@@ -74,10 +143,25 @@ class PostlogisticsWebService(object):
     def _prepare_recipient(self, picking):
         """Create a ns0:Recipient as a dict from a partner
 
+        The block is cached per partner until the partner changes.
+
         :param partner: partner browse record
         :return a dict containing data for ns0:Recipient
 
         """
+        partner = picking.partner_id
+        key = (
+            picking.env.cr.dbname,
+            partner.id,
+            picking.delivery_phone,
+            picking.delivery_mobile,
+        )
+        stamp = (partner.write_date, partner.parent_id.id, partner.parent_id.write_date)
+        return self._payload_cache.get(
+            key, stamp, lambda: self._build_recipient(picking)
+        )
+
+    def _build_recipient(self, picking):
         partner = picking.partner_id
         partner_mobile = self._sanitize_string(
             picking.delivery_mobile or partner.mobile
@@ -139,14 +223,28 @@ class PostlogisticsWebService(object):
 
         This is the PostLogistics Customer, thus the sender
 
+        The block is cached per carrier until the company partner changes.
+
         :param picking: picking browse record
         :return a dict containing data for ns0:Customer
 
         """
-        company = picking.company_id
-        partner = company.partner_id
+        partner = picking.company_id.partner_id
+        carrier = picking.carrier_id
+        key = (picking.env.cr.dbname, partner.id, carrier.id)
+        stamp = (partner.write_date, carrier.postlogistics_office)
+        customer = self._payload_cache.get(
+            key, stamp, lambda: self._build_customer(picking)
+        )
+        logo, logo_format = self._get_logo(carrier)
+        if logo:
+            customer["logo"] = logo
+            customer["logoFormat"] = logo_format
+        return customer
 
-        customer = {
+    def _build_customer(self, picking):
+        partner = picking.company_id.partner_id
+        return {
             "name1": self._sanitize_string(partner.name),
             "street": self._sanitize_string(partner.street),
             "zip": self._sanitize_string(partner.zip),
@@ -154,13 +252,43 @@ class PostlogisticsWebService(object):
             "country": partner.country_id.code,
             "domicilePostOffice": picking.carrier_id.postlogistics_office or None,
         }
-        logo = picking.carrier_id.postlogistics_logo
-        if logo:
-            logo_image = Image.open(BytesIO(base64.b64decode(logo)))
-            logo_format = logo_image.format
-            customer["logo"] = logo.decode()
-            customer["logoFormat"] = logo_format
-        return customer
+
+    @classmethod
+    def _get_logo(cls, carrier):
+        """Return the logo of the carrier and its image format
+
+        Detecting the format requires to decode and parse the image, so the
+        result is cached per carrier until the logo attachment changes.
+
+        :return: tuple (base64 logo as str, image format) or (None, None)
+        """
+        attachment = (
+            carrier.env["ir.attachment"]
+            .sudo()
+            .search_read(
+                [
+                    ("res_model", "=", carrier._name),
+                    ("res_field", "=", "postlogistics_logo"),
+                    ("res_id", "=", carrier.id),
+                ],
+                ["checksum"],
+                limit=1,
+            )
+        )
+        if not attachment:
+            return None, None
+        checksum = attachment[0]["checksum"]
+        key = (carrier.env.cr.dbname, carrier.id)
+        cached = cls._logo_cache.get(key)
+        if cached and cached[0] == checksum:
+            return cached[1], cached[2]
+
+        from PIL import Image
+
+        logo = carrier.postlogistics_logo
+        logo_format = Image.open(BytesIO(base64.b64decode(logo))).format
+        cls._logo_cache[key] = (checksum, logo.decode(), logo_format)
+        return logo.decode(), logo_format
 
     def _get_label_layout(self, picking):
         """
@@ -198,7 +326,7 @@ class PostlogisticsWebService(object):
             and pack.packaging_id
             or picking.carrier_id.postlogistics_default_packaging_id
         )
-        services = packaging._get_packaging_codes()
+        services, service_set = packaging._get_parsed_packaging_codes()
 
         if pack_weight:
             total_weight = pack_weight
@@ -214,38 +342,48 @@ class PostlogisticsWebService(object):
                 ).format(packaging.name, picking.name)
             )
 
+        # the parsed codes are shared, they are only copied when changed
+        added = []
+        removed = set()
+
         # Activate phone notification ZAW3213
         # if phone call notification is set on partner
         if picking.partner_id.postlogistics_notification == "phone":
-            services.append("ZAW3213")
+            added.append("ZAW3213")
 
         attributes = {
             "weight": int(total_weight),
         }
 
         # Remove the services if the delivery fixed date is not set
-        if "ZAW3217" in services:
+        if "ZAW3217" in service_set:
             if picking.delivery_fixed_date:
                 attributes["deliveryDate"] = picking.delivery_fixed_date
             else:
-                services.remove("ZAW3217")
+                removed.add("ZAW3217")
 
         # parcelNo / parcelTotal cannot be used if service ZAW3218 is not activated
-        if "ZAW3218" in services:
+        if "ZAW3218" in service_set:
             if pack_total > 1:
                 attributes.update(
                     {"parcelTotal": pack_total - 1, "parcelNo": pack_num - 1}
                 )
             else:
-                services.remove("ZAW3218")
+                removed.add("ZAW3218")
 
-        if "ZAW3219" in services and picking.delivery_place:
+        if added or removed:
+            services = tuple(code for code in services if code not in removed) + tuple(
+                added
+            )
+
+        if "ZAW3219" in service_set and picking.delivery_place:
             attributes["deliveryPlace"] = picking.delivery_place
         if picking.carrier_id.postlogistics_proclima_logo:
             attributes["proClima"] = True
         else:
             attributes["proClima"] = False
 
+        # a tuple, shared with the packaging cache when no service changed
         attributes["przl"] = services
 
         return attributes
@@ -265,22 +403,60 @@ class PostlogisticsWebService(object):
         codes = [name, pack_no]
         return "+".join(c for c in codes if c)
 
-    def _cash_on_delivery(self, picking, package=None):
-        amount = (package or picking).postlogistics_cod_amount()
+    def _is_cash_on_delivery(self, package):
+        if not package.packaging_id:
+            return False
+        codes = package.packaging_id._get_parsed_packaging_codes()[1]
+        return bool(codes & {"BLN", "N"})
+
+    def _get_cod_amounts(self, packages):
+        """Cash on delivery amounts of the packages of a run which need one
+
+        :return: dict {package id: amount}
+        """
+        cod_packages = packages.filtered(self._is_cash_on_delivery)
+        return cod_packages._postlogistics_cod_amounts()
+
+    def _load_cod_amounts(self, packages):
+        """Compute at once the cash on delivery amounts of the packages not
+        known yet
+        """
+        packages = packages.filtered(lambda p: p.id not in self._cod_amounts)
+        if packages:
+            amounts = self._get_cod_amounts(packages)
+            self._cod_amounts.update(
+                {package.id: amounts.get(package.id) for package in packages}
+            )
+
+    def _cash_on_delivery(self, picking, package=None, amount=None):
+        if amount is None:
+            amount = (package or picking).postlogistics_cod_amount()
         amount = "{:.2f}".format(amount)
         return [{"Type": "NN_BETRAG", "Value": amount}]
 
-    def _get_item_additional_data(self, picking, package=None):
+    def _get_item_additional_data(self, picking, package=None, cod_amounts=None):
+        """Additional data of an item
+
+        :param cod_amounts: optional dict {package id: amount} as returned
+                            by `_get_cod_amounts`
+        """
         if package and not package.packaging_id:
             raise exceptions.UserError(
                 _("The package %s must have a package type.") % package.name
             )
 
         result = []
-        packaging_codes = package and package.packaging_id._get_packaging_codes() or []
+        packaging_codes = (
+            package
+            and package.packaging_id._get_parsed_packaging_codes()[1]
+            or frozenset()
+        )
 
-        if set(packaging_codes) & {"BLN", "N"}:
-            cod_attributes = self._cash_on_delivery(picking, package=package)
+        if packaging_codes & {"BLN", "N"}:
+            amount = cod_amounts.get(package.id) if cod_amounts else None
+            cod_attributes = self._cash_on_delivery(
+                picking, package=package, amount=amount
+            )
             result += cod_attributes
         return result
 
@@ -296,13 +472,39 @@ class PostlogisticsWebService(object):
         picking_num = _compile_itemnum.sub("", picking.name)
         return "%02d%s" % (pack_num, picking_num[-6:].zfill(6))
 
+    def _load_picking_packages(self, pickings, packages_by_picking=None):
+        """Read at once the packages of the pickings not known yet
+
+        :param packages_by_picking: optional packages already read, as
+                                    returned by `_get_packages_by_picking`
+        """
+        if packages_by_picking:
+            self._picking_packages.update(packages_by_picking)
+        pickings = pickings.filtered(lambda p: p.id not in self._picking_packages)
+        if pickings:
+            self._picking_packages.update(pickings._get_packages_by_picking())
+
+    def _get_pack_numbers(self, picking, packages):
+        """Number the packages by their position among all the packages
+        of the picking, so a package keeps its number when only some of
+        the packages are sent, e.g. when a run is resumed
+
+        :return: tuple (dict {package id: number}, total number of packages)
+        """
+        self._load_picking_packages(picking)
+        all_packages = self._picking_packages[picking.id]
+        if not packages <= all_packages:
+            # packages not found in the picking, number them as given
+            all_packages = packages
+        numbers = {package.id: num for num, package in enumerate(all_packages, 1)}
+        return numbers, len(all_packages)
+
     def _prepare_item_list(self, picking, recipient, packages):
         """ Return a list of item made from the pickings """
         carrier = picking.carrier_id
         item_list = []
-        pack_counter = 1
 
-        def add_item(package=None):
+        def add_item(package=None, pack_num=None):
             assert picking or package
             itemid = self._get_itemid(picking, package.name if package else None)
             item = {
@@ -317,27 +519,30 @@ class PostlogisticsWebService(object):
                     picking_num = _compile_itemnum.sub("", picking.name)
                     item_number = "9%s" % picking_num[-7:].zfill(7)
                 else:
-                    item_number = self._get_item_number(picking, pack_counter)
+                    item_number = self._get_item_number(picking, pack_num)
                 item["itemNumber"] = item_number
 
-            additional_data = self._get_item_additional_data(picking, package=package)
+            additional_data = self._get_item_additional_data(
+                picking, package=package, cod_amounts=cod_amounts
+            )
             if additional_data:
                 item["additionalData"] = additional_data
 
             item_list.append(item)
 
         if not packages:
+            cod_amounts = None
             attributes = self._prepare_attributes(picking)
             add_item()
             return item_list
 
-        pack_total = len(packages)
+        self._load_cod_amounts(packages)
+        cod_amounts = self._cod_amounts
+        pack_numbers, pack_total = self._get_pack_numbers(picking, packages)
         for pack in packages:
-            attributes = self._prepare_attributes(
-                picking, pack, pack_counter, pack_total
-            )
-            add_item(package=pack)
-            pack_counter += 1
+            pack_num = pack_numbers[pack.id]
+            attributes = self._prepare_attributes(picking, pack, pack_num, pack_total)
+            add_item(package=pack, pack_num=pack_num)
         return item_list
 
     def _prepare_label_definition(self, picking):
@@ -387,7 +592,57 @@ class PostlogisticsWebService(object):
         }
 
     @classmethod
-    def _request_access_token(cls, delivery_carrier):
+    def _get_session(cls, delivery_carrier):
+        """Return the pooled keep-alive session of the carrier's endpoint"""
+        return transport.get_session(
+            delivery_carrier.postlogistics_endpoint_url,
+            pool_size=delivery_carrier.postlogistics_pool_size,
+            keep_alive=delivery_carrier.postlogistics_keep_alive,
+        )
+
+    @classmethod
+    def _get_retry_policy(cls, delivery_carrier, idempotent=True):
+        """Return how the calls to the carrier's endpoint are retried
+
+        :param idempotent: False for the calls creating something, like a
+            label, which must not be sent twice
+        """
+        breaker = None
+        if delivery_carrier.postlogistics_circuit_threshold > 0:
+            breaker = transport.get_circuit_breaker(
+                delivery_carrier.postlogistics_endpoint_url,
+                delivery_carrier.postlogistics_circuit_threshold,
+                delivery_carrier.postlogistics_circuit_reset_timeout,
+            )
+        bucket = delivery_carrier._get_rate_limit_bucket()
+        return transport.RetryPolicy(
+            max_retries=max(delivery_carrier.postlogistics_max_retries, 0),
+            backoff=delivery_carrier.postlogistics_retry_backoff,
+            breaker=breaker,
+            bucket=bucket,
+            idempotent=idempotent,
+        )
+
+    @classmethod
+    def _get_access_token_key(cls, delivery_carrier):
+        return (
+            delivery_carrier.postlogistics_endpoint_url,
+            delivery_carrier.postlogistics_client_id,
+            TOKEN_SCOPE,
+        )
+
+    @classmethod
+    def _get_access_token_fetcher(cls, delivery_carrier, min_validity=None):
+        """Return a function requesting a new token to the API
+
+        The returned function does not access the records of the current
+        transaction, so it can be called from another thread to renew the
+        token.
+
+        When the carrier shares its token between workers, the token stored
+        in the database is returned instead if it is still valid for
+        `min_validity` seconds.
+        """
         if not delivery_carrier.postlogistics_endpoint_url:
             raise exceptions.UserError(
                 _(
@@ -412,35 +667,138 @@ class PostlogisticsWebService(object):
                 )
             )
 
-        response = requests.post(
-            url=authentication_url,
-            headers={"content-type": "application/x-www-form-urlencoded"},
-            data={
-                "grant_type": "client_credentials",
-                "client_id": client_id,
-                "client_secret": client_secret,
-                "scope": "WEDEC_BARCODE_READ",
-            },
-            timeout=60,
+        session = cls._get_session(delivery_carrier)
+        policy = cls._get_retry_policy(delivery_carrier)
+
+        def fetch():
+            response = transport.post(
+                session,
+                authentication_url,
+                policy=policy,
+                headers={"content-type": "application/x-www-form-urlencoded"},
+                data={
+                    "grant_type": "client_credentials",
+                    "client_id": client_id,
+                    "client_secret": client_secret,
+                    "scope": TOKEN_SCOPE,
+                },
+                timeout=60,
+            )
+            return response.json()
+
+        if not delivery_carrier.postlogistics_shared_token:
+            return fetch
+        if min_validity is None:
+            min_validity = cls.access_token_expiry_margin
+        registry = delivery_carrier.env.registry
+        key = cls._get_access_token_key(delivery_carrier)
+
+        def fetch_shared():
+            with api.Environment.manage(), registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                return env["postlogistics.access.token"]._get_shared_token(
+                    key, fetch, min_validity=min_validity
+                )
+
+        return fetch_shared
+
+    @classmethod
+    def _request_access_token(cls, delivery_carrier):
+        return cls._get_access_token_fetcher(delivery_carrier)()
+
+    @classmethod
+    def _get_access_token_lock(cls, key):
+        with cls._lock:
+            return cls._access_token_locks.setdefault(key, threading.Lock())
+
+    @classmethod
+    def _get_cached_access_token(cls, key):
+        """Return the cached token of the key if it is still valid
+
+        :return: tuple (token, needs_refresh)
+        """
+        cached = cls._access_tokens.get(key)
+        if not cached:
+            return False, False
+        access_token, expiry, refresh_at = cached
+        now = datetime.now()
+        if now >= expiry - timedelta(seconds=cls.access_token_expiry_margin):
+            return False, False
+        return access_token, refresh_at is not None and now >= refresh_at
+
+    @classmethod
+    def _store_access_token(cls, key, response):
+        access_token = response.get("access_token", False)
+        if not access_token:
+            return False
+        now = datetime.now()
+        expires_in = response["expires_in"]
+        refresh_at = None
+        # short-lived tokens are simply requested again once expired
+        if expires_in > 2 * cls.access_token_refresh_margin:
+            refresh_at = now + timedelta(
+                seconds=expires_in - cls.access_token_refresh_margin
+            )
+        cls._access_tokens[key] = (
+            access_token,
+            now + timedelta(seconds=expires_in),
+            refresh_at,
         )
-        return response.json()
+        return access_token
 
     @classmethod
-    def get_access_token(cls, picking_carrier):
-        """Threadsafe access to token"""
+    def _refresh_access_token_async(cls, key, fetch):
+        """Renew a token in background before it expires"""
         with cls._lock:
-            now = datetime.now()
+            if key in cls._access_token_refreshing:
+                return
+            cls._access_token_refreshing.add(key)
+
+        def refresh():
+            try:
+                with cls._get_access_token_lock(key):
+                    cls._store_access_token(key, fetch())
+            except Exception:
+                _logger.exception("PostLogistics access token could not be renewed")
+            finally:
+                with cls._lock:
+                    cls._access_token_refreshing.discard(key)
+
+        threading.Thread(
+            target=refresh, name="postlogistics-token-refresh", daemon=True
+        ).start()
 
-            if cls.access_token:
-                # keep a safe margin on the expiration
-                expiry = cls.access_token_expiry - timedelta(seconds=5)
-                if now < expiry:
-                    return cls.access_token
+    @classmethod
+    def get_access_token(cls, picking_carrier):
+        """Threadsafe access to token
+
+        Tokens are shared by the carriers using the same endpoint and
+        credentials. Only the requests needing a new token for the same
+        credentials wait for each other.
+        """
+        key = cls._get_access_token_key(picking_carrier)
+        access_token, needs_refresh = cls._get_cached_access_token(key)
+        if access_token:
+            if needs_refresh:
+                cls._refresh_access_token_async(
+                    key,
+                    cls._get_access_token_fetcher(
+                        picking_carrier,
+                        min_validity=cls.access_token_refresh_margin,
+                    ),
+                )
+            return access_token
+
+        with cls._get_access_token_lock(key):
+            # another thread may have renewed it while we were waiting
+            access_token, __ = cls._get_cached_access_token(key)
+            if access_token:
+                return access_token
 
             response = cls._request_access_token(picking_carrier)
-            cls.access_token = response.get("access_token", False)
+            access_token = cls._store_access_token(key, response)
 
-            if not (cls.access_token):
+            if not access_token:
                 raise exceptions.UserError(
                     _(
                         "Authorization Required\n\n"
@@ -449,103 +807,293 @@ class PostlogisticsWebService(object):
                         " Shipping Methods > PostLogistics"
                     )
                 )
-
-            cls.access_token_expiry = now + timedelta(seconds=response["expires_in"])
-            return cls.access_token
+            return access_token
 
     def _sanitize_string(self, value):
         """Removes disallowed chars ("|", "\", "<", ">", "’", "‘") from strings."""
         if isinstance(value, str):
-            for char, repl in DISALLOWED_CHARS_MAPPING.items():
-                value = value.replace(char, repl)
+            value = value.translate(DISALLOWED_CHARS_TABLE)
         return value
 
+    def _post_label_request(self, session, url, headers, data, policy=None):
+        """Send one generateAddressLabel request
+
+        Called from worker threads when labels are requested concurrently,
+        so it must not access any record.
+        """
+        return transport.post(
+            session,
+            url,
+            policy=policy,
+            headers=headers,
+            data=json.dumps(data),
+            timeout=60,
+        )
+
+    def _parse_label_response(self, data, response, file_type):
+        """Convert a generateAddressLabel response to a label result
+
+        :param response: the response or the exception raised when the
+                         request could not be sent
+        """
+        res = {"value": [], "item_id": data["item"]["itemID"]}
+        if isinstance(response, transport.CircuitOpenError):
+            res["success"] = False
+            res["errors"] = _(
+                "PostLogistics is currently unavailable, too many requests "
+                "failed. Please retry later."
+            )
+            return res
+        if isinstance(response, RateLimitExceeded):
+            res["success"] = False
+            res["errors"] = _(
+                "Too many labels are requested to PostLogistics at the moment. "
+                "Please retry later."
+            )
+            return res
+        if isinstance(response, requests.RequestException):
+            res["success"] = False
+            res["errors"] = _("PostLogistics could not be reached: %s") % response
+            _logger.warning(
+                "Shipping label could not be generated.\n"
+                "Request: %s\n"
+                "Error: %s" % (json.dumps(data), response)
+            )
+            return res
+        if response.status_code != 200:
+            res["success"] = False
+            res["errors"] = response.content.decode("utf-8")
+            _logger.warning(
+                "Shipping label could not be generated.\n"
+                "Request: %s\n"
+                "Response: %s" % (json.dumps(data), res["errors"])
+            )
+            return res
+
+        response_dict = json.loads(response.content)
+
+        if response_dict["item"].get("errors"):
+            res["success"] = False
+            res["errors"] = []
+            for error in response_dict["item"]["errors"]:
+                res["errors"] = _("Error code: %s, Message: %s") % (
+                    error["code"],
+                    error["message"],
+                )
+            return res
+
+        # the only decoding of the label, the raw bytes are stored as is
+        binary = base64.b64decode(response_dict["item"]["label"][0])
+        res["success"] = True
+        res["value"].append(
+            {
+                "item_id": data["item"]["itemID"],
+                "binary": binary,
+                "tracking_number": response_dict["item"]["identCode"],
+                "file_type": file_type,
+            }
+        )
+        return res
+
+    def _get_label_concurrency(self, picking):
+        """Number of label requests of a picking sent in parallel"""
+        return max(picking.carrier_id.postlogistics_label_concurrency, 1)
+
+    def _prepare_label_payloads(self, picking, packages):
+        """Prepare the generateAddressLabel payloads of a picking
+
+        :param picking: picking browse record
+        :param packages: browse records of packages to generate labels for
+        :return: tuple (file type, list of payloads, one per package)
+        """
+        lang = self._get_language(picking.partner_id.lang)
+        with metrics.timer(metrics.PREPARE_CUSTOMER, picking=picking.id):
+            post_customer = self._prepare_customer(picking)
+        with metrics.timer(metrics.PREPARE_RECIPIENT, picking=picking.id):
+            recipient = self._prepare_recipient(picking)
+        with metrics.timer(
+            metrics.PREPARE_ITEM_LIST, picking=picking.id, packages=len(packages)
+        ):
+            item_list = self._prepare_item_list(picking, recipient, packages)
+        labelDefinition = self._prepare_label_definition(picking)
+        frankingLicense = self._get_license(picking)
+
+        output_format = self._get_output_format(picking).lower()
+        file_type = output_format if output_format != "spdf" else "pdf"
+        return file_type, [
+            self._prepare_data(
+                lang, frankingLicense, post_customer, labelDefinition, item
+            )
+            for item in item_list
+        ]
+
+    def get_label_fingerprint(self, picking, packages):
+        """Return a digest of everything the labels of a picking depend on
+
+        Labels generated in advance are only used while the fingerprint of
+        their picking is unchanged.
+        """
+        file_type, payloads = self._prepare_label_payloads(picking, packages)
+        content = json.dumps([file_type, payloads], sort_keys=True, default=str)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def _prepare_label_requests(self, picking, packages):
+        """Prepare the generateAddressLabel requests of a picking
+
+        :param picking: picking browse record
+        :param packages: browse records of packages to generate labels for
+        :return: a list of dict, one per package, holding the request data
+                 and everything needed to send it without reading records
+        """
+        picking_carrier = picking.carrier_id
+        with metrics.timer(metrics.TOKEN_FETCH, picking=picking.id):
+            access_token = self.get_access_token(picking_carrier)
+
+        file_type, payloads = self._prepare_label_payloads(picking, packages)
+        session = self._get_session(picking_carrier)
+        # a label request which timed out may have created a label
+        policy = self._get_retry_policy(picking_carrier, idempotent=False)
+        generate_label_url = urllib.parse.urljoin(
+            picking_carrier.postlogistics_endpoint_url, GENERATE_LABEL_PATH
+        )
+        headers = {
+            "Authorization": "Bearer %s" % access_token,
+            "accept": "application/json",
+            "content-type": "application/json",
+        }
+        return [
+            {
+                "picking_id": picking.id,
+                "resumable": picking_carrier.postlogistics_resumable_labels,
+                "session": session,
+                "policy": policy,
+                "url": generate_label_url,
+                "headers": headers,
+                "file_type": file_type,
+                "data": data,
+            }
+            for data in payloads
+        ]
+
+    def _send_label_requests(self, label_requests, concurrency=1):
+        """Send label requests and parse their responses
+
+        With a concurrency of 1, the requests are sent one after the other
+        and, unless the run of the picking is resumable, the remaining
+        requests of a picking are skipped after its first error. Otherwise
+        they are all sent in parallel.
+
+        :return: list of tuples (label request, label result) in the order
+                 of the requests
+        """
+
+        def send(request):
+            try:
+                with metrics.timer(metrics.HTTP_CALL, picking=request["picking_id"]):
+                    return self._post_label_request(
+                        request["session"],
+                        request["url"],
+                        request["headers"],
+                        request["data"],
+                        policy=request["policy"],
+                    )
+            except (
+                requests.RequestException,
+                transport.CircuitOpenError,
+                RateLimitExceeded,
+            ) as exc:
+                return exc
+
+        def parse(request, response):
+            with metrics.timer(metrics.RESPONSE_DECODE, picking=request["picking_id"]):
+                return self._parse_label_response(
+                    request["data"], response, request["file_type"]
+                )
+
+        results = []
+        if concurrency <= 1:
+            failed_picking_ids = set()
+            for request in label_requests:
+                if request["picking_id"] in failed_picking_ids:
+                    continue
+                res = parse(request, send(request))
+                if not res["success"] and not request["resumable"]:
+                    # If facing an error, stop all operations of the picking
+                    failed_picking_ids.add(request["picking_id"])
+                results.append((request, res))
+            return results
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            # map keeps the order of the requests
+            responses = list(executor.map(send, label_requests))
+        for request, response in zip(label_requests, responses):
+            res = parse(request, response)
+            results.append((request, res))
+        return results
+
     def generate_label(self, picking, packages):
         """Generate a label for a picking
 
+        When the carrier allows concurrent requests, the labels of all the
+        packages are requested in parallel and every package is attempted.
+        Otherwise the packages are sent one after the other and, unless
+        the carrier has resumable runs, the generation stops at the first
+        error.
+
         :param picking: picking browse record
         :param user_lang: OpenERP language code
         :param packages: browse records of packages to filter on
-        :return: {
+        :return: [{
             value: [{item_id: pack id
-                     binary: file returned by API
+                     binary: label file returned by API, as bytes
                      tracking_number: id number for tracking
                      file_type: str of file type
                      }
                     ]
-            errors: list of error message if any
-            warnings: list of warning message if any
-        }
+            success: True if the label has been generated
+            errors: error message if any
+            item_id: item id of the request
+        }] with one result per package, in the order of the packages
 
         """
-        results = []
-        picking_carrier = picking.carrier_id
-        access_token = self.get_access_token(picking_carrier)
-
-        # get options
-        lang = self._get_language(picking.partner_id.lang)
-        post_customer = self._prepare_customer(picking)
-        recipient = self._prepare_recipient(picking)
-        item_list = self._prepare_item_list(picking, recipient, packages)
-        labelDefinition = self._prepare_label_definition(picking)
-        frankingLicense = self._get_license(picking)
+        label_requests = self._prepare_label_requests(picking, packages)
+        concurrency = min(self._get_label_concurrency(picking), len(label_requests))
+        return [
+            res for __, res in self._send_label_requests(label_requests, concurrency)
+        ]
 
-        for item in item_list:
-            data = self._prepare_data(
-                lang, frankingLicense, post_customer, labelDefinition, item
-            )
+    def generate_labels(self, picking_packages):
+        """Generate the labels of many pickings at once
 
-            res = {"value": []}
+        The requests of all the pickings are prepared first, with the
+        packages and cash on delivery amounts of all the pickings read at
+        once, then sent through the same pooled, concurrent pipeline.
 
-            generate_label_url = urllib.parse.urljoin(
-                picking_carrier.postlogistics_endpoint_url, GENERATE_LABEL_PATH
-            )
-            response = requests.post(
-                url=generate_label_url,
-                headers={
-                    "Authorization": "Bearer %s" % access_token,
-                    "accept": "application/json",
-                    "content-type": "application/json",
-                },
-                data=json.dumps(data),
-                timeout=60,
+        :param picking_packages: list of tuples (picking, packages)
+        :return: dict {picking id: results as returned by `generate_label`}
+        """
+        label_requests = []
+        concurrency = 1
+        if picking_packages:
+            pickings = picking_packages[0][0].browse(
+                [picking.id for picking, __ in picking_packages]
             )
-
-            if response.status_code != 200:
-                res["success"] = False
-                res["errors"] = response.content.decode("utf-8")
-                _logger.warning(
-                    "Shipping label could not be generated.\n"
-                    "Request: %s\n"
-                    "Response: %s" % (json.dumps(data), res["errors"])
+            self._load_picking_packages(pickings)
+            self._load_cod_amounts(
+                pickings.env["stock.quant.package"].browse(
+                    [
+                        package.id
+                        for __, packages in picking_packages
+                        for package in packages
+                    ]
                 )
-                return [res]
-
-            response_dict = json.loads(response.content.decode("utf-8"))
-
-            if response_dict["item"].get("errors"):
-                # If facing an error, top all operations and return the result
-                res["success"] = False
-                res["errors"] = []
-                for error in response_dict["item"]["errors"]:
-                    res["errors"] = _("Error code: %s, Message: %s") % (
-                        error["code"],
-                        error["message"],
-                    )
-                results.append(res)
-                return results
-
-            output_format = self._get_output_format(picking).lower()
-            file_type = output_format if output_format != "spdf" else "pdf"
-            binary = base64.b64encode(bytes(response_dict["item"]["label"][0], "utf-8"))
-            res["success"] = True
-            res["value"].append(
-                {
-                    "item_id": item_list[0]["itemID"],
-                    "binary": binary,
-                    "tracking_number": response_dict["item"]["identCode"],
-                    "file_type": file_type,
-                }
             )
-            results.append(res)
+        for picking, packages in picking_packages:
+            label_requests += self._prepare_label_requests(picking, packages)
+            concurrency = max(concurrency, self._get_label_concurrency(picking))
+        concurrency = min(concurrency, len(label_requests))
+
+        results = {picking.id: [] for picking, __ in picking_packages}
+        for request, res in self._send_label_requests(label_requests, concurrency):
+            results[request["picking_id"]].append(res)
         return results
@@ -1,2 +1,7 @@
 from . import test_postlogistics
 from . import test_sanitize_values
+from . import test_label_generation
+from . import test_access_token
+from . import test_transport
+from . import test_benchmark
+from . import test_metrics
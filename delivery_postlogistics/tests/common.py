@@ -1,5 +1,9 @@
 # Copyright 2021 Camptocamp SA
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+import base64
+import json
+from contextlib import contextmanager
+from unittest import mock
 
 from odoo.tests.common import SavepointCase
 
@@ -11,6 +15,41 @@ CLIENT_SECRET = "XXX"
 LICENSE = "XXX"
 
 
+class FakeResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.content = json.dumps(payload).encode("utf-8")
+
+
+def label_response(data):
+    """Successful response of the API to a label request"""
+    item_id = data["item"]["itemID"]
+    return FakeResponse(
+        200,
+        {
+            "item": {
+                "label": [base64.b64encode(item_id.encode()).decode()],
+                "identCode": "99.60.%s" % item_id,
+            }
+        },
+    )
+
+
+def label_response_result(item_id):
+    """Parsed result of `label_response`"""
+    return {
+        "success": True,
+        "value": [
+            {
+                "item_id": item_id,
+                "binary": item_id.encode(),
+                "tracking_number": "99.60.%s" % item_id,
+                "file_type": "pdf",
+            }
+        ],
+    }
+
+
 class TestPostlogisticsCommon(SavepointCase):
     @classmethod
     def setUpClassLicense(cls):
@@ -114,6 +153,28 @@ class TestPostlogisticsCommon(SavepointCase):
     def setUpClassWebservice(cls):
         cls.service_class = PostlogisticsWebService(cls.env.user.company_id)
 
+    @contextmanager
+    def mock_api(self, respond=label_response):
+        """Replace the token and label requests to the API
+
+        :param respond: function returning the response to the payload of
+                        a label request, every label succeeds by default
+        :return: the mock of the label requests
+        """
+
+        def post_label_request(service, session, url, headers, data, policy=None):
+            return respond(data)
+
+        with mock.patch.object(
+            PostlogisticsWebService, "get_access_token", return_value="TOKEN"
+        ), mock.patch.object(
+            PostlogisticsWebService,
+            "_post_label_request",
+            autospec=True,
+            side_effect=post_label_request,
+        ) as mocked:
+            yield mocked
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -0,0 +1,138 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+"""Local stand-in for the PostLogistics API
+
+Implements the token and generateAddressLabel endpoints with a configurable
+latency, error rate and label size, to measure the label throughput
+without calling wedecint.post.ch.
+
+It can also be started standalone::
+
+    python standin_server.py --port 8099 --latency 0.05 --error-rate 0.01
+
+and used as the endpoint URL of a delivery method (http://127.0.0.1:8099/).
+"""
+import argparse
+import base64
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+AUTH_PATH = "/WEDECOAuth/token"
+GENERATE_LABEL_PATH = "/api/barcode/v1/generateAddressLabel"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # keep-alive, as the real API
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if server.latency:
+            time.sleep(server.latency)
+        if self.path == AUTH_PATH:
+            self._reply(
+                200,
+                {
+                    "access_token": "STANDIN",
+                    "token_type": "Bearer",
+                    "expires_in": server.token_lifetime,
+                },
+            )
+        elif self.path == GENERATE_LABEL_PATH:
+            if server.error_rate and random.random() < server.error_rate:
+                self._reply(503, {"error": "Service temporarily unavailable"})
+                return
+            item = json.loads(body)["item"]
+            self._reply(
+                200,
+                {
+                    "item": {
+                        "itemID": item["itemID"],
+                        "identCode": "99.60.%08d" % next(server.counter),
+                        "label": [server.label],
+                    }
+                },
+            )
+        else:
+            self._reply(404, {"error": "Not found"})
+
+
+class PostlogisticsStandIn(ThreadingMixIn, HTTPServer):
+    """Stand-in server, runs in a background thread
+
+    :param latency: seconds waited before answering each request
+    :param error_rate: ratio of label requests answered with a 503
+    :param label_size: size in bytes of the (fake PDF) labels returned
+    :param token_lifetime: `expires_in` of the tokens returned
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port=0,
+        latency=0.0,
+        error_rate=0.0,
+        label_size=30000,
+        token_lifetime=3600,
+    ):
+        super().__init__(("127.0.0.1", port), StandInHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.token_lifetime = token_lifetime
+        self.counter = itertools.count(1)
+        content = b"%PDF-1.4\n" + b"0" * max(label_size - 9, 0)
+        self.label = base64.b64encode(content).decode("ascii")
+        self._thread = None
+
+    @property
+    def url(self):
+        return "http://%s:%s/" % self.server_address
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--label-size", type=int, default=30000)
+    parser.add_argument("--token-lifetime", type=int, default=3600)
+    args = parser.parse_args()
+    server = PostlogisticsStandIn(
+        port=args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        label_size=args.label_size,
+        token_lifetime=args.token_lifetime,
+    )
+    sys.stdout.write("PostLogistics stand-in listening on %s\n" % server.url)
+    server.serve_forever()
@@ -0,0 +1,160 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+from datetime import timedelta
+from unittest import mock
+
+import requests
+
+from odoo import exceptions, fields
+
+from ..postlogistics import transport
+from ..postlogistics.web_service import PostlogisticsWebService
+from .common import TestPostlogisticsCommon
+
+
+class TestAccessToken(TestPostlogisticsCommon):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.dict(PostlogisticsWebService._access_tokens, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _mock_request_access_token(self, expires_in=60):
+        def request_access_token(carrier):
+            return {
+                "access_token": "TOKEN-%s" % carrier.postlogistics_client_id,
+                "expires_in": expires_in,
+            }
+
+        return mock.patch.object(
+            PostlogisticsWebService,
+            "_request_access_token",
+            side_effect=request_access_token,
+        )
+
+    def test_token_per_credentials(self):
+        other_carrier = self.carrier.copy({"postlogistics_client_id": "YYY"})
+        with self._mock_request_access_token() as mocked:
+            token = PostlogisticsWebService.get_access_token(self.carrier)
+            other_token = PostlogisticsWebService.get_access_token(other_carrier)
+            # cached for both credentials
+            PostlogisticsWebService.get_access_token(self.carrier)
+            PostlogisticsWebService.get_access_token(other_carrier)
+        self.assertEqual(token, "TOKEN-XXX")
+        self.assertEqual(other_token, "TOKEN-YYY")
+        self.assertEqual(mocked.call_count, 2)
+
+    def test_token_shared_by_same_credentials(self):
+        other_carrier = self.carrier.copy()
+        with self._mock_request_access_token() as mocked:
+            PostlogisticsWebService.get_access_token(self.carrier)
+            PostlogisticsWebService.get_access_token(other_carrier)
+        self.assertEqual(mocked.call_count, 1)
+
+    def test_token_refreshed_in_background(self):
+        with self._mock_request_access_token(expires_in=3600):
+            PostlogisticsWebService.get_access_token(self.carrier)
+        key = PostlogisticsWebService._get_access_token_key(self.carrier)
+        token, expiry, refresh_at = PostlogisticsWebService._access_tokens[key]
+        PostlogisticsWebService._access_tokens[key] = (token, expiry, expiry.min)
+        with mock.patch.object(
+            PostlogisticsWebService, "_refresh_access_token_async"
+        ) as refresh:
+            self.assertEqual(
+                PostlogisticsWebService.get_access_token(self.carrier), token
+            )
+        self.assertEqual(refresh.call_count, 1)
+
+
+class TestSharedAccessToken(TestPostlogisticsCommon):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.carrier.postlogistics_shared_token = True
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.dict(PostlogisticsWebService._access_tokens, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # the shared token is read and stored with a new cursor
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+        self.token_model = self.env["postlogistics.access.token"]
+
+    def _count_advisory_locks(self):
+        self.env.cr.execute(
+            "SELECT count(*) FROM pg_locks "
+            "WHERE locktype = 'advisory' AND pid = pg_backend_pid()"
+        )
+        return self.env.cr.fetchone()[0]
+
+    def _mock_post(self, tokens):
+        """Answer the token requests with the given tokens, in order"""
+        tokens = iter(tokens)
+        locks = []
+
+        def post(session, url, policy=None, **kwargs):
+            # the API is called while holding the lock of the key
+            locks.append(self._count_advisory_locks())
+            response = mock.Mock()
+            response.json.return_value = next(tokens)
+            return response
+
+        patcher = mock.patch.object(transport, "post", side_effect=post)
+        return patcher, locks
+
+    def _get_process_token(self):
+        PostlogisticsWebService._access_tokens.clear()
+        return PostlogisticsWebService.get_access_token(self.carrier)
+
+    def test_shared_token_stored_and_reused(self):
+        patcher, locks = self._mock_post(
+            [{"access_token": "SHARED", "expires_in": 3600}]
+        )
+        with patcher as post:
+            self.assertEqual(self._get_process_token(), "SHARED")
+            # another worker, without the token in its memory
+            self.assertEqual(self._get_process_token(), "SHARED")
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(locks, [1])
+        self.assertEqual(self._count_advisory_locks(), 0)
+        token = self.token_model.search([])
+        self.assertEqual(token.access_token, "SHARED")
+
+    def test_shared_token_min_validity(self):
+        patcher, locks = self._mock_post(
+            [
+                {"access_token": "SHARED", "expires_in": 3600},
+                {"access_token": "RENEWED", "expires_in": 3600},
+            ]
+        )
+        with patcher as post:
+            self._get_process_token()
+            token = self.token_model.search([])
+            # still valid, but not long enough for a background renewal
+            token.expiry = fields.Datetime.now() + timedelta(seconds=30)
+            token.flush()
+            self.assertEqual(self._get_process_token(), "SHARED")
+            fetch = PostlogisticsWebService._get_access_token_fetcher(
+                self.carrier,
+                min_validity=PostlogisticsWebService.access_token_refresh_margin,
+            )
+            self.assertEqual(fetch()["access_token"], "RENEWED")
+        self.assertEqual(post.call_count, 2)
+        token.invalidate_cache()
+        self.assertEqual(token.access_token, "RENEWED")
+        self.assertEqual(self._count_advisory_locks(), 0)
+
+    def test_shared_token_not_stored_on_error(self):
+        patcher, locks = self._mock_post([{"error": "invalid_client"}])
+        with patcher, self.assertRaises(exceptions.UserError):
+            self._get_process_token()
+        self.assertFalse(self.token_model.search([]))
+        self.assertEqual(self._count_advisory_locks(), 0)
+
+        with mock.patch.object(
+            transport, "post", side_effect=requests.ConnectionError
+        ), self.assertRaises(requests.ConnectionError):
+            self._get_process_token()
+        self.assertEqual(self._count_advisory_locks(), 0)
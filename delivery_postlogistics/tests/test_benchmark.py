@@ -0,0 +1,140 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+"""Label throughput benchmark against the local PostLogistics stand-in
+
+Not part of the standard tests, run it with::
+
+    odoo -d DB -i delivery_postlogistics --test-tags postlogistics_benchmark
+
+The stand-in latency, error rate and label size as well as the package
+counts can be tuned with the POSTLOGISTICS_BENCHMARK_* environment
+variables. The error rate only applies to the generate_label benchmark, as
+_generate_postlogistics_label commits the failed runs.
+"""
+import logging
+import math
+import os
+import time
+
+from odoo.tests import tagged
+
+from ..postlogistics import transport
+from ..postlogistics.web_service import PostlogisticsWebService
+from .common import TestPostlogisticsCommon
+from .standin_server import PostlogisticsStandIn
+
+_logger = logging.getLogger(__name__)
+
+
+def env_setting(name, default, cast=float):
+    return cast(os.environ.get("POSTLOGISTICS_BENCHMARK_%s" % name, default))
+
+
+class TimedWebService(PostlogisticsWebService):
+    """Records the duration of every label request"""
+
+    def __init__(self, company):
+        super().__init__(company)
+        self.latencies = []
+
+    def _post_label_request(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super()._post_label_request(*args, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile"""
+    values = sorted(values)
+    rank = max(int(math.ceil(percent / 100.0 * len(values))), 1)
+    return values[rank - 1]
+
+
+@tagged("-standard", "postlogistics_benchmark")
+class TestBenchmark(TestPostlogisticsCommon):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = PostlogisticsStandIn(
+            latency=env_setting("LATENCY", 0.02),
+            error_rate=env_setting("ERROR_RATE", 0.0),
+            label_size=env_setting("LABEL_SIZE", 30000, int),
+        ).start()
+        cls.carrier.write(
+            {
+                "postlogistics_endpoint_url": cls.server.url,
+                "postlogistics_label_concurrency": env_setting("CONCURRENCY", 8, int),
+                "postlogistics_retry_backoff": 0.01,
+            }
+        )
+        cls.package_counts = [
+            int(count)
+            for count in os.environ.get(
+                "POSTLOGISTICS_BENCHMARK_SIZES", "1,10,100,1000"
+            ).split(",")
+        ]
+        cls.picking = cls.create_picking()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        transport.close_sessions()
+        super().tearDownClass()
+
+    def _create_packages(self, count):
+        return self.env["stock.quant.package"].create(
+            [
+                {
+                    "name": "BENCH%05d" % idx,
+                    "packaging_id": self.postlogistics_pd_packaging.id,
+                }
+                for idx in range(count)
+            ]
+        )
+
+    def _report(self, entry_point, count, duration, latencies):
+        _logger.info(
+            "%s, %d packages: %.3fs, %.1f labels/s, "
+            "request latency p50 %.1fms p95 %.1fms",
+            entry_point,
+            count,
+            duration,
+            count / duration,
+            percentile(latencies, 50) * 1000,
+            percentile(latencies, 95) * 1000,
+        )
+
+    def test_generate_label(self):
+        for count in self.package_counts:
+            packages = self._create_packages(count)
+            web_service = TimedWebService(self.env.user.company_id)
+            start = time.perf_counter()
+            results = web_service.generate_label(self.picking, packages)
+            duration = time.perf_counter() - start
+            self.assertEqual(len(results), count)
+            self._report("generate_label", count, duration, web_service.latencies)
+
+    def test_generate_postlogistics_label(self):
+        self.server.error_rate = 0.0
+        for count in self.package_counts:
+            packages = self._create_packages(count)
+            web_services = []
+
+            def webservice_class(company):
+                web_service = TimedWebService(company)
+                web_services.append(web_service)
+                return web_service
+
+            start = time.perf_counter()
+            self.picking._generate_postlogistics_label(
+                webservice_class=webservice_class, package_ids=packages.ids
+            )
+            duration = time.perf_counter() - start
+            self._report(
+                "_generate_postlogistics_label",
+                count,
+                duration,
+                web_services[0].latencies,
+            )
@@ -0,0 +1,300 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+from unittest import mock
+
+from odoo.addons.delivery_carrier_label_merge import label_merge
+
+from ..postlogistics.web_service import PostlogisticsWebService
+from .common import (
+    FakeResponse,
+    TestPostlogisticsCommon,
+    label_response,
+    label_response_result,
+)
+
+
+class TestLabelGeneration(TestPostlogisticsCommon):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.picking = cls.create_picking()
+        cls.packages = cls.picking._get_packages_from_picking()
+        package_model = cls.env["stock.quant.package"]
+        for __ in range(3):
+            cls.packages |= package_model.create(
+                {"packaging_id": cls.postlogistics_pd_packaging.id}
+            )
+
+    def _generate_label(self, respond=label_response):
+        with self.mock_api(respond) as mocked:
+            results = self.service_class.generate_label(self.picking, self.packages)
+        return results, mocked
+
+    def test_concurrent_labels_keep_order(self):
+        self.carrier.postlogistics_label_concurrency = 4
+
+        results, mocked = self._generate_label()
+        self.assertEqual(mocked.call_count, 4)
+        item_ids = [res["value"][0]["item_id"] for res in results]
+        self.assertEqual(
+            item_ids,
+            [
+                self.service_class._get_itemid(self.picking, p.name)
+                for p in self.packages
+            ],
+        )
+        self.assertTrue(all(res["success"] for res in results))
+
+    def test_sequential_labels_stop_on_error(self):
+        self.carrier.postlogistics_label_concurrency = 1
+
+        def respond(data):
+            if mocked_calls:
+                return FakeResponse(503, {"error": "unavailable"})
+            mocked_calls.append(data)
+            return label_response(data)
+
+        mocked_calls = []
+        results, mocked = self._generate_label(respond)
+        self.assertEqual(mocked.call_count, 2)
+        self.assertEqual([res["success"] for res in results], [True, False])
+
+    def test_batch_labels(self):
+        self.carrier.postlogistics_label_concurrency = 4
+        pickings = self.picking | self.create_picking()
+
+        with self.mock_api() as mocked:
+            labels = pickings._generate_postlogistics_labels(skip_attach_file=True)
+        self.assertEqual(mocked.call_count, 2)
+        self.assertEqual(len(labels), 2)
+        for picking in pickings:
+            package = picking._get_packages_from_picking()
+            self.assertTrue(picking.carrier_tracking_ref)
+            self.assertEqual(package.parcel_tracking, picking.carrier_tracking_ref)
+
+    def test_tracking_number_exact_package_match(self):
+        package_model = self.env["stock.quant.package"]
+        packages = package_model.create({"name": "PACK1"}) | package_model.create(
+            {"name": "PACK10"}
+        )
+        label_results = [
+            {
+                "success": True,
+                "value": [
+                    {
+                        "item_id": self.service_class._get_itemid(
+                            self.picking, package.name
+                        ),
+                        "binary": b"label",
+                        "tracking_number": "99.60.%s" % package.name,
+                        "file_type": "pdf",
+                    }
+                ],
+            }
+            for package in packages.sorted("name", reverse=True)
+        ]
+        self.picking.carrier_tracking_ref = False
+        labels = self.picking.write_tracking_number_label(label_results, packages)
+        self.assertEqual(len(labels), 2)
+        self.assertEqual(packages[0].parcel_tracking, "99.60.PACK1")
+        self.assertEqual(packages[1].parcel_tracking, "99.60.PACK10")
+        self.assertEqual(self.picking.carrier_tracking_ref, "99.60.PACK1; 99.60.PACK10")
+
+    def test_resumable_labels_attempt_all_packages(self):
+        self.carrier.postlogistics_label_concurrency = 1
+        self.carrier.postlogistics_resumable_labels = True
+        failing_item_id = self.service_class._get_itemid(
+            self.picking, self.packages[1].name
+        )
+
+        def respond(data):
+            if data["item"]["itemID"] == failing_item_id:
+                return FakeResponse(503, {"error": "unavailable"})
+            return label_response(data)
+
+        results, mocked = self._generate_label(respond)
+        self.assertEqual(mocked.call_count, 4)
+        self.assertEqual([res["success"] for res in results], [True, False, True, True])
+        self.assertEqual(results[1]["item_id"], failing_item_id)
+
+        messages = self.picking.write_label_errors(
+            [res for res in results if not res["success"]], self.packages
+        )
+        failed_package = self.packages[1]
+        self.assertTrue(failed_package.postlogistics_label_error)
+        self.assertEqual(len(messages), 1)
+        self.assertTrue(messages[0].startswith(failed_package.name))
+
+        self.picking.write_tracking_number_label(
+            [label_response_result(failing_item_id)], self.packages
+        )
+        self.assertFalse(failed_package.postlogistics_label_error)
+        self.assertEqual(failed_package.parcel_tracking, "99.60.%s" % failing_item_id)
+
+    def test_resumed_labels_keep_pack_numbers(self):
+        self.carrier.postlogistics_tracking_format = "picking_num"
+        self.postlogistics_pd_packaging.shipper_package_code = "PRI, ZAW3218"
+        picking = self.create_picking()
+        move_line = picking.move_line_ids
+        for __ in range(2):
+            self.env["stock.move.line"].create(
+                {
+                    "picking_id": picking.id,
+                    "product_id": move_line.product_id.id,
+                    "product_uom_id": move_line.product_uom_id.id,
+                    "location_id": move_line.location_id.id,
+                    "location_dest_id": move_line.location_dest_id.id,
+                    "qty_done": 1,
+                    "result_package_id": self.env["stock.quant.package"]
+                    .create({"packaging_id": self.postlogistics_pd_packaging.id})
+                    .id,
+                }
+            )
+        packages = picking._get_packages_from_picking()
+        self.assertEqual(len(packages), 3)
+        # the third package is sent alone, e.g. when the run is resumed
+        web_service = PostlogisticsWebService(self.env.user.company_id)
+        item = web_service._prepare_item_list(picking, {}, packages[2])[0]
+        self.assertEqual(item["attributes"]["parcelNo"], 2)
+        self.assertEqual(item["attributes"]["parcelTotal"], 2)
+        self.assertEqual(item["itemNumber"], web_service._get_item_number(picking, 3))
+
+    def test_packages_by_picking(self):
+        other_picking = self.create_picking()
+        pickings = self.picking | other_picking
+        packages_by_picking = pickings._get_packages_by_picking()
+        self.assertEqual(set(packages_by_picking), set(pickings.ids))
+        for picking in pickings:
+            packages = packages_by_picking[picking.id]
+            self.assertEqual(len(packages), 1)
+            self.assertEqual(
+                packages, picking.move_line_ids.mapped("result_package_id")
+            )
+        self.assertEqual(self.env["stock.picking"]._get_packages_by_picking(), {})
+
+    def test_cod_amounts(self):
+        self.packages[1].postlogistics_manual_cod_amount = 42.5
+        amounts = self.packages._postlogistics_cod_amounts()
+        self.assertEqual(amounts[self.packages[1].id], 42.5)
+        self.assertEqual(amounts[self.packages[0].id], 0.0)
+        self.assertEqual(self.packages[1].postlogistics_cod_amount(), 42.5)
+
+        item_list = self.service_class._prepare_item_list(
+            self.picking, {}, self.packages
+        )
+        self.assertEqual(
+            [item["additionalData"][0]["Value"] for item in item_list],
+            ["0.00", "42.50", "0.00", "0.00"],
+        )
+
+    def test_single_picking_labels_attached_at_once(self):
+        picking_class = type(self.picking)
+        with self.mock_api(), mock.patch.object(
+            picking_class,
+            "_attach_postlogistics_labels",
+            autospec=True,
+            side_effect=picking_class._attach_postlogistics_labels,
+        ) as attach_labels:
+            self.picking._generate_postlogistics_label(package_ids=self.packages.ids)
+        self.assertEqual(attach_labels.call_count, 1)
+        self.assertEqual(
+            self.env["postlogistics.shipping.label"].search_count(
+                [("res_model", "=", "stock.picking"), ("res_id", "=", self.picking.id)]
+            ),
+            len(self.packages),
+        )
+
+    def test_cod_amounts_prefetched(self):
+        pickings = self.picking | self.create_picking()
+        picking_packages = [
+            (picking, picking._get_packages_from_picking()) for picking in pickings
+        ]
+        web_service = PostlogisticsWebService(self.env.user.company_id)
+        with self.mock_api(), mock.patch.object(
+            PostlogisticsWebService,
+            "_get_cod_amounts",
+            autospec=True,
+            side_effect=PostlogisticsWebService._get_cod_amounts,
+        ) as get_cod_amounts:
+            web_service.generate_labels(picking_packages)
+        self.assertEqual(get_cod_amounts.call_count, 1)
+
+    def test_pregenerated_labels(self):
+        cache_model = self.env["postlogistics.label.cache"]
+        with self.mock_api() as mocked:
+            self.picking._postlogistics_pregenerate_labels()
+            self.assertEqual(mocked.call_count, 1)
+            # nothing changed, the labels are not requested again
+            self.picking._postlogistics_pregenerate_labels()
+            self.assertEqual(mocked.call_count, 1)
+            pregenerated = cache_model.search([("picking_id", "=", self.picking.id)])
+            self.assertEqual(len(pregenerated), 1)
+            labels = self.picking._generate_postlogistics_labels()
+            self.assertEqual(mocked.call_count, 1)
+        package = self.picking._get_packages_from_picking()
+        self.assertEqual(package.parcel_tracking, pregenerated.tracking_number)
+        self.assertEqual(labels[0]["raw"], pregenerated.item_id.encode())
+        self.assertFalse(pregenerated.exists())
+
+    def test_pregenerated_labels_single_picking(self):
+        cache_model = self.env["postlogistics.label.cache"]
+        with self.mock_api() as mocked:
+            self.picking._postlogistics_pregenerate_labels()
+            pregenerated = cache_model.search([("picking_id", "=", self.picking.id)])
+            self.picking.generate_postlogistics_shipping_labels()
+            self.assertEqual(mocked.call_count, 1)
+        package = self.picking._get_packages_from_picking()
+        self.assertEqual(package.parcel_tracking, pregenerated.tracking_number)
+        self.assertFalse(pregenerated.exists())
+
+    def test_pregenerated_labels_purged(self):
+        cache_model = self.env["postlogistics.label.cache"]
+        with self.mock_api():
+            self.picking._postlogistics_pregenerate_labels()
+        pregenerated = cache_model.search([("picking_id", "=", self.picking.id)])
+        attachments = self.env["ir.attachment"].search(
+            [("res_model", "=", cache_model._name), ("res_id", "=", pregenerated.id)]
+        )
+        self.assertTrue(attachments)
+        cache_model._purge()
+        self.assertTrue(pregenerated.exists())
+        self.picking.action_cancel()
+        cache_model._purge()
+        self.assertFalse(pregenerated.exists())
+        self.assertFalse(attachments.exists())
+
+    def test_pregenerated_labels_outdated(self):
+        with self.mock_api() as mocked:
+            self.picking._postlogistics_pregenerate_labels()
+            self.picking.partner_id.street = "Rue du Lac 2"
+            self.picking._generate_postlogistics_labels(skip_attach_file=True)
+            self.assertEqual(mocked.call_count, 2)
+        self.assertFalse(
+            self.env["postlogistics.label.cache"].search(
+                [("picking_id", "=", self.picking.id)]
+            )
+        )
+
+    def test_merged_labels(self):
+        other_picking = self.create_picking()
+        pickings = other_picking | self.picking
+        label_model = self.env["postlogistics.shipping.label"]
+        labels = label_model.create(
+            [
+                dict(
+                    raw=b"^XA^FD%s^FS^XZ" % picking.name.encode(),
+                    name="label.zpl2",
+                    res_model="stock.picking",
+                    res_id=picking.id,
+                    file_type="zpl2",
+                )
+                for picking in pickings
+            ]
+        )
+        file_type, sources = pickings._get_merged_label_sources(
+            "postlogistics.shipping.label"
+        )
+        self.assertEqual(file_type, "zpl")
+        self.assertEqual(
+            sources, label_merge.get_sources(labels.mapped("attachment_id"))
+        )
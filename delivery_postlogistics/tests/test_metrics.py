@@ -0,0 +1,59 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+from ..postlogistics import metrics
+from .common import TestPostlogisticsCommon
+
+
+class TestMetrics(TestPostlogisticsCommon):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.picking = cls.create_picking()
+
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+    def test_registry_export(self):
+        registry = metrics.Registry(buckets=(0.1, 1.0))
+        for duration in (0.05, 0.5, 2.0):
+            registry.observe("http_call", duration)
+        count, total = registry.get("http_call")
+        self.assertEqual(count, 3)
+        self.assertAlmostEqual(total, 2.55)
+        self.assertEqual(registry.get("token_fetch"), (0, 0.0))
+        lines = registry.export_text().splitlines()
+        for bound, count in (("0.1", 1), ("1.0", 2), ("+Inf", 3)):
+            self.assertIn(
+                'postlogistics_label_phase_seconds_bucket{phase="http_call",le="%s"} %d'
+                % (bound, count),
+                lines,
+            )
+        self.assertIn(
+            'postlogistics_label_phase_seconds_count{phase="http_call"} 3', lines
+        )
+
+    def test_generate_label_phases(self):
+        self.carrier.postlogistics_label_concurrency = 2
+        packages = self.picking._get_packages_from_picking()
+        packages |= self.env["stock.quant.package"].create(
+            {"packaging_id": self.postlogistics_pd_packaging.id}
+        )
+        with self.mock_api():
+            self.service_class.generate_label(self.picking, packages)
+        for phase in (
+            metrics.TOKEN_FETCH,
+            metrics.PREPARE_CUSTOMER,
+            metrics.PREPARE_RECIPIENT,
+            metrics.PREPARE_ITEM_LIST,
+        ):
+            self.assertEqual(metrics.registry.get(phase)[0], 1, phase)
+        for phase in (metrics.HTTP_CALL, metrics.RESPONSE_DECODE):
+            self.assertEqual(metrics.registry.get(phase)[0], 2, phase)
+
+    def test_picking_phases(self):
+        with self.mock_api():
+            self.picking._generate_postlogistics_labels()
+        for phase in (metrics.TRACKING_WRITE, metrics.ATTACHMENT_CREATE):
+            self.assertEqual(metrics.registry.get(phase)[0], 1, phase)
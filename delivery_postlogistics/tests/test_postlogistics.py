@@ -1,9 +1,11 @@
 # Copyright 2015-2019 Camptocamp
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 from os.path import dirname, join
+from unittest import mock
 
 from vcr import VCR
 
+from ..postlogistics.web_service import PostlogisticsWebService
 from .common import TestPostlogisticsCommon
 
 recorder = VCR(
@@ -17,6 +19,11 @@ recorder = VCR(
     decode_compressed_response=True,
 )
 
+LOGO = (
+    b"iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8A"
+    b"AAAASUVORK5CYII="
+)
+
 
 class TestPostlogistics(TestPostlogisticsCommon):
     @classmethod
@@ -45,7 +52,7 @@ class TestPostlogistics(TestPostlogisticsCommon):
         ref = "996001321700005959"
         self.assertEqual(res[0]["file_type"], "pdf")
         self.assertEqual(res[0]["name"], "{}.pdf".format(ref))
-        self.assertEqual(res[0]["file"][:30], b"JVBERi0xLjQKJeLjz9MKMiAwIG9iag")
+        self.assertEqual(res[0]["raw"][:21], b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n2 0 obj")
         self.assertEqual(self.picking.carrier_tracking_ref, ref)
 
     def test_missing_language(self):
@@ -62,7 +69,7 @@ class TestPostlogistics(TestPostlogisticsCommon):
         ref = "996001321700005959"
         self.assertEqual(res[0]["file_type"], "pdf")
         self.assertEqual(res[0]["name"], "{}.pdf".format(ref))
-        self.assertEqual(res[0]["file"][:30], b"JVBERi0xLjQKJeLjz9MKMiAwIG9iag")
+        self.assertEqual(res[0]["raw"][:21], b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n2 0 obj")
         self.assertEqual(self.picking.carrier_tracking_ref, ref)
 
     def test_prepare_recipient(self):
@@ -107,3 +114,65 @@ class TestPostlogistics(TestPostlogisticsCommon):
             res = self.carrier.postlogistics_rate_shipment(None)
             self.assertEqual(len(cassette.requests), 2)
         self.assertEqual(res["price"], 1.0)
+
+    def test_session_pool(self):
+        session = PostlogisticsWebService._get_session(self.carrier)
+        self.assertIs(session, PostlogisticsWebService._get_session(self.carrier))
+        self.carrier.postlogistics_endpoint_url = "https://wedec.post.ch/"
+        self.assertIsNot(session, PostlogisticsWebService._get_session(self.carrier))
+
+    def test_logo_cache(self):
+        self.carrier.postlogistics_logo = LOGO
+        logo, logo_format = PostlogisticsWebService._get_logo(self.carrier)
+        self.assertEqual(logo, LOGO.decode())
+        self.assertEqual(logo_format, "PNG")
+        with mock.patch("PIL.Image.open") as image_open:
+            customer = self.service_class._prepare_customer(self.picking)
+        image_open.assert_not_called()
+        self.assertEqual(customer["logoFormat"], "PNG")
+
+    def test_packaging_codes_cache(self):
+        packaging = self.postlogistics_pd_packaging
+        codes = packaging._get_parsed_packaging_codes()
+        self.assertEqual(codes, (("PRI", "BLN"), frozenset({"PRI", "BLN"})))
+        self.assertIs(packaging._get_parsed_packaging_codes(), codes)
+
+        self.picking.partner_id.postlogistics_notification = "phone"
+        self.picking.partner_id.phone = "+41211234567"
+        package = self.picking._get_packages_from_picking()
+        attributes = self.service_class._prepare_attributes(self.picking, package, 1, 1)
+        self.assertEqual(list(attributes["przl"]), ["PRI", "BLN", "ZAW3213"])
+        self.assertIs(packaging._get_parsed_packaging_codes(), codes)
+
+        packaging.shipper_package_code = "PRI, ZAW3218"
+        self.assertEqual(packaging._get_packaging_codes(), ["PRI", "ZAW3218"])
+        attributes = self.service_class._prepare_attributes(self.picking, package, 1, 1)
+        self.assertEqual(list(attributes["przl"]), ["PRI", "ZAW3213"])
+
+    def test_recipient_cache(self):
+        service = self.service_class
+        recipient = service._prepare_recipient(self.picking)
+        recipient["name1"] = "Changed"
+        with mock.patch.object(
+            PostlogisticsWebService, "_build_recipient"
+        ) as build_recipient:
+            cached = service._prepare_recipient(self.picking)
+        build_recipient.assert_not_called()
+        self.assertNotEqual(cached["name1"], "Changed")
+
+        self.picking.partner_id.street = "Avenue <de la> Gare 1"
+        recipient = service._prepare_recipient(self.picking)
+        self.assertEqual(recipient["street"], "Avenue de la Gare 1")
+
+    def test_customer_cache(self):
+        service = self.service_class
+        service._prepare_customer(self.picking)
+        with mock.patch.object(
+            PostlogisticsWebService, "_build_customer"
+        ) as build_customer:
+            service._prepare_customer(self.picking)
+        build_customer.assert_not_called()
+
+        self.carrier.postlogistics_office = "1015"
+        customer = service._prepare_customer(self.picking)
+        self.assertEqual(customer["domicilePostOffice"], "1015")
@@ -0,0 +1,122 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+from unittest import mock
+
+import requests
+
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.delivery_carrier_rate_limit import rate_limit
+
+from ..postlogistics import transport
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeSession:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+@mock.patch.object(transport.time, "sleep")
+class TestTransport(TransactionCase):
+    def test_retry_transient_errors(self, sleep):
+        session = FakeSession([503, requests.ConnectionError(), 429, 200])
+        policy = transport.RetryPolicy(max_retries=3)
+        response = transport.post(session, "https://post.test", policy=policy)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session.calls, 4)
+        self.assertEqual(sleep.call_count, 3)
+
+    def test_retry_not_idempotent(self, sleep):
+        policy = transport.RetryPolicy(max_retries=3, idempotent=False)
+        # refused or never sent: retried
+        session = FakeSession([503, requests.ConnectTimeout(), 429, 200])
+        response = transport.post(session, "https://post.test", policy=policy)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session.calls, 4)
+        # the server may have processed the request: not retried
+        session = FakeSession([502, 200])
+        response = transport.post(session, "https://post.test", policy=policy)
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(session.calls, 1)
+        session = FakeSession([requests.ReadTimeout(), 200])
+        with self.assertRaises(requests.ReadTimeout):
+            transport.post(session, "https://post.test", policy=policy)
+        self.assertEqual(session.calls, 1)
+
+    def test_no_retry_on_client_error(self, sleep):
+        session = FakeSession([400])
+        policy = transport.RetryPolicy(max_retries=3)
+        response = transport.post(session, "https://post.test", policy=policy)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(session.calls, 1)
+
+    def test_retries_exhausted(self, sleep):
+        session = FakeSession([503, 503])
+        policy = transport.RetryPolicy(max_retries=1)
+        response = transport.post(session, "https://post.test", policy=policy)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(session.calls, 2)
+
+    def test_retry_after(self, sleep):
+        policy = transport.RetryPolicy(backoff=0.5)
+        delay = policy.get_delay(0, FakeResponse(429, {"Retry-After": "7"}))
+        self.assertEqual(delay, 7)
+        self.assertLessEqual(policy.get_delay(3), 4)
+
+    def test_circuit_breaker(self, sleep):
+        breaker = transport.CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        policy = transport.RetryPolicy(breaker=breaker)
+        session = FakeSession([503, 503, 200])
+        transport.post(session, "https://post.test", policy=policy)
+        transport.post(session, "https://post.test", policy=policy)
+        with self.assertRaises(transport.CircuitOpenError):
+            transport.post(session, "https://post.test", policy=policy)
+        self.assertEqual(session.calls, 2)
+        # once the pause is over, a successful call closes the circuit
+        breaker.reset_timeout = 0
+        transport.post(session, "https://post.test", policy=policy)
+        self.assertTrue(breaker.allow())
+
+    def test_circuit_breaker_statuses(self, sleep):
+        breaker = transport.CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        policy = transport.RetryPolicy(breaker=breaker)
+        # throttling is no outage
+        session = FakeSession([429, 429, 429])
+        for __ in range(3):
+            transport.post(session, "https://post.test", policy=policy)
+        self.assertTrue(breaker.allow())
+        # any server error is one, even when the call is not retried
+        session = FakeSession([500, 500])
+        for __ in range(2):
+            transport.post(session, "https://post.test", policy=policy)
+        self.assertFalse(breaker.allow())
+
+    def test_post_waits_for_bucket(self, sleep):
+        bucket = mock.Mock()
+        policy = transport.RetryPolicy(
+            max_retries=1, bucket=bucket, rate_limit_timeout=5
+        )
+        session = FakeSession([503, 200])
+        response = transport.post(session, "https://post.test", policy=policy)
+        self.assertEqual(response.status_code, 200)
+        # each attempt waited for a token
+        self.assertEqual(bucket.acquire.call_args_list, [mock.call(5)] * 2)
+        bucket.acquire.side_effect = rate_limit.RateLimitExceeded()
+        session = FakeSession([200])
+        with self.assertRaises(rate_limit.RateLimitExceeded):
+            transport.post(session, "https://post.test", policy=policy)
+        self.assertEqual(session.calls, 0)
@@ -177,6 +177,8 @@ class StockQuantPackage(models.Model):
 
         # hook to override request / payload
         payload = self._before_call(picking, payload)
+        # stay under the quota of the carrier's API
+        picking.carrier_id._wait_rate_limit(account)
         try:
             # api call
             ret = roulier.get(picking.delivery_type, "get_label", payload)
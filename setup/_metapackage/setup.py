@@ -12,8 +12,10 @@ setuptools.setup(
         'odoo14-addon-delivery_carrier_category',
         'odoo14-addon-delivery_carrier_city',
         'odoo14-addon-delivery_carrier_info',
+        'odoo14-addon-delivery_carrier_label_merge',
         'odoo14-addon-delivery_carrier_partner',
         'odoo14-addon-delivery_carrier_pricelist',
+        'odoo14-addon-delivery_carrier_rate_limit',
         'odoo14-addon-delivery_free_fee_removal',
         'odoo14-addon-delivery_multi_destination',
         'odoo14-addon-delivery_package_fee',